@@ -3,7 +3,33 @@ Algorithm with Step 6 - Vertical Ordering by Cluster
 Based on algo3.py with cluster-based vertical organization
 """
 
-from collections import defaultdict
+import os
+import sys
+import heapq
+from collections import defaultdict, deque
+from functools import lru_cache
+
+
+# Traces détaillées (dumps intermédiaires, clusters de debug). ALGO_TRACE=0
+# les désactive, ainsi que le calcul des listes qui ne servent qu'à l'affichage
+VERBOSE = os.environ.get("ALGO_TRACE", "1") != "0"
+
+# Sortie bufferisée : les lignes sont accumulées puis écrites en un seul
+# sys.stdout.write à la fin de chaque étape (au lieu d'un print par ligne)
+_out = []
+
+def emit(line=""):
+    """Ajoute une ligne à la sortie de l'étape en cours"""
+    _out.append(line)
+
+def flush_output():
+    """Écrit les lignes accumulées de l'étape en un seul appel"""
+    if _out:
+        _out.append("")
+        sys.stdout.write("\n".join(_out))
+        _out.clear()
+
+_OPERATORS = ('<>', '->', '>', '<', '-')
 
 
 # === DONNÉES DE TEST ===
@@ -78,377 +104,443 @@ comments.userId > users.id
 
 relations_input = relations_input_1  # Nouveau DSL avec table.field
 
-# Parse relations
-relations = []
-for line in relations_input.strip().split('\n'):
-    line = line.strip()
-    if not line:
-        continue
-
-    # Detect relation type and parse accordingly
-    # Priority matters: check <> first, then ->, then individual < or >, then -
-    # All relations: element on LEFT of the symbol stays on LEFT in the diagram
-
-    if '<>' in line:
-        # Many-to-many: A <> B means A is on left of B
-        parts = line.split('<>')
-        a = parts[0].strip()
-        b = parts[1].strip()
-        relations.append((a, b))
-    elif '->' in line:
-        # One-to-many: A -> B means A is on left of B
-        parts = line.split('->')
-        a = parts[0].strip()
-        b = parts[1].strip()
-        relations.append((a, b))
-    elif '>' in line:
-        # Many-to-one: A > B means A is on left of B
-        parts = line.split('>')
-        a = parts[0].strip()
-        b = parts[1].strip()
-        relations.append((a, b))
-    elif '<' in line:
-        # One-to-many: A < B means A is on left of B
-        parts = line.split('<')
-        a = parts[0].strip()
-        b = parts[1].strip()
-        relations.append((a, b))
-    elif '-' in line:
-        # One-to-one: A - B means A is on left of B
-        parts = line.split('-')
-        a = parts[0].strip()
-        b = parts[1].strip()
-        relations.append((a, b))
-
-print("=== ÉTAPE 1 : RELATIONS DÉTECTÉES ===")
-for a, b in relations:
-    print(f"{a} > {b}")
-
-# === ÉTAPE 2 : ORDRE DES RELATIONS ===
-entity_order = ['users', 'orders', 'teams', 'workspaces', 'reviews', 'products',
-                'payments', 'carts', 'addresses', 'order_items', 'shipments',
-                'cart_items', 'folders', 'categories']
-
-print("\n=== ÉTAPE 2 : ORDRE DES ENTITÉS ===")
-print(f"Ordre: {' > '.join(entity_order)}")
-
-# === ÉTAPE 3 : BUILD CLUSTERS ===
-print("\n=== ÉTAPE 3 : BUILD CLUSTERS ===\n")
-
-clusters = {}
-
-for iteration, entity_name in enumerate(entity_order, 1):
-    # Construire le cluster
-    cluster_left = []
-    cluster_right = [entity_name]
-
-    for a, b in relations:
-        if b == entity_name and a not in cluster_left:
-            cluster_left.append(a)
-
-    clusters[entity_name] = {
-        'left': cluster_left,
-        'right': cluster_right
-    }
+# Ordre de traitement écrit pour relations_input
+DEFAULT_ENTITY_ORDER = ('users', 'orders', 'teams', 'workspaces', 'reviews', 'products',
+                        'payments', 'carts', 'addresses', 'order_items', 'shipments',
+                        'cart_items', 'folders', 'categories')
 
-    print(f"{iteration}) Cluster '{entity_name}':")
-    print(f"   {cluster_left} > {cluster_right}")
+# === FONCTIONS ===
+# Tout le calcul vit dans des fonctions (état local, pas de globals) ;
+# main() enchaîne les étapes et gère l'affichage
 
-# === ÉTAPE 4 : BUILD LAYERS ===
-print("\n=== ÉTAPE 4 : BUILD LAYERS ===\n")
-
-layers = []
-
-def find_layer_index(entity):
-    """Trouve l'index du layer contenant l'entité"""
-    for idx, layer in enumerate(layers):
-        if entity in layer:
-            return idx
-    return None
-
-def remove_from_layers(entity):
-    """Supprime une entité de tous les layers"""
-    for layer in layers:
-        while entity in layer:
-            layer.remove(entity)
-
-def can_add_to_layer(entity, layer_idx):
-    """Vérifie si on peut ajouter une entité à un layer"""
-    if layer_idx >= len(layers):
-        return True
-
-    # Vérifier qu'il n'y a pas de relation avec les entités du layer
-    for existing in layers[layer_idx]:
-        for a, b in relations:
-            if (a == entity and b == existing) or (a == existing and b == entity):
-                return False
-    return True
-
-def move_entity_to_right_of_parent(parent_entity, child_entity):
+@lru_cache(maxsize=32)
+def parse_relations(relations_input):
     """
-    Déplace child_entity à droite de parent_entity.
-    Retourne le nouveau layer_idx de child_entity.
+    Parse le DSL en relations (left, right), sans doublons.
+    Fonction pure : le résultat (tuple immuable) est mis en cache par DSL,
+    un DSL déjà vu n'est pas re-parsé lors d'un nouvel appel à main()
     """
-    parent_layer = find_layer_index(parent_entity)
-    if parent_layer is None:
-        return None
-
-    # Supprimer child de son layer actuel
-    remove_from_layers(child_entity)
-
-    # Chercher un layer à droite du parent où on peut placer child
-    for layer_idx in range(parent_layer + 1, len(layers)):
-        if can_add_to_layer(child_entity, layer_idx):
-            layers[layer_idx].append(child_entity)
-            return layer_idx
-
-    # Aucun layer compatible trouvé : créer un nouveau layer
-    layers.append([child_entity])
-    return len(layers) - 1
-
-# Traiter chaque entité
-for iteration, entity_name in enumerate(entity_order, 1):
-    print(f"{iteration}) Entité '{entity_name}':")
-
-    cluster_left = clusters[entity_name]['left']
-    cluster_right = clusters[entity_name]['right']
-
-    print(f"cluster-{entity_name} > {cluster_left} > {cluster_right}")
-    print()
+    relations = []
+    seen_relations = set()  # (left, right) déjà vus : un doublon ne crée pas de relation
+    for line in relations_input.strip().split('\n'):
+        line = line.strip()
+        if not line or line.startswith('//'):
+            continue
+
+        # Detect relation type and parse accordingly
+        # Priority matters: <> first, then ->, then individual > or <, then -
+        # (a '-' inside a table name such as order-items is not an operator
+        # when the line has a higher-priority one). Lines without any
+        # operator are not relations.
+        # All relations: element on LEFT of the symbol stays on LEFT in the diagram
+        #   A <> B : many-to-many
+        #   A -> B : one-to-many
+        #   A > B  : many-to-one
+        #   A < B  : one-to-many
+        #   A - B  : one-to-one
+        for operator in _OPERATORS:
+            index = line.find(operator)
+            if index != -1:
+                break
+        else:
+            continue
+        # Right side stops at the next occurrence of the same operator
+        right = line[index + len(operator):].partition(operator)[0]
+        pair = (line[:index].strip(), right.strip())
+        # Ignorer les doublons et les auto-relations (A > A)
+        if pair[0] != pair[1] and pair not in seen_relations:
+            seen_relations.add(pair)
+            relations.append(pair)
+
+    return tuple(relations)
+
+def build_adjacency(relations):
+    """
+    Listes d'adjacence construites une seule fois (ordre des relations conservé)
+    au lieu de re-parcourir toutes les relations pour chaque entité
+    """
+    parents_of = defaultdict(list)   # entité -> entités qui pointent vers elle
+    children_of = defaultdict(list)  # entité -> entités vers lesquelles elle pointe
+    neighbors = defaultdict(set)     # entité -> voisins, sens ignoré (conflits de layer)
+    for a, b in relations:
+        parents_of[b].append(a)
+        children_of[a].append(b)
+        neighbors[a].add(b)
+        neighbors[b].add(a)
+    return parents_of, children_of, neighbors
 
-    # Premier cluster
-    if not layers:
-        if cluster_left:
-            layers.append(cluster_left[:])
-        layers.append(cluster_right[:])
-        print(f"=>")
-        for idx, layer in enumerate(layers):
-            print(f"Layer {idx}: {layer}")
-        print()
-        continue
-
-    # Chercher une ancre
-    anchor = None
-    anchor_layer = None
-    anchor_location = None
-
-    # Chercher dans RIGHT
-    for e in cluster_right:
-        idx = find_layer_index(e)
+def build_entity_order(relations, parents_of, children_of):
+    """
+    Ordre de traitement dérivé des relations (même règle que algo8-11) :
+    l'entité la plus connectée d'abord, puis à chaque étape la plus connectée
+    parmi les voisines déjà atteintes (départage : rang global, puis ordre
+    d'apparition). Une composante épuisée repart de la plus connectée restante,
+    si bien que chaque entité du DSL est traitée.
+    """
+    connections = {}
+    for pair in relations:
+        for e in pair:
+            if e not in connections:
+                connections[e] = len(parents_of[e]) + len(children_of[e])
+
+    ranked = sorted(connections, key=connections.__getitem__, reverse=True)
+    rank = {e: i for i, e in enumerate(ranked)}
+
+    entity_order = []
+    placed = set()
+    for start in ranked:
+        if start in placed:
+            continue
+        frontier = [(-connections[start], rank[start], start)]
+        while frontier:
+            entity = heapq.heappop(frontier)[2]
+            if entity in placed:
+                continue
+            entity_order.append(entity)
+            placed.add(entity)
+            for voisin in children_of[entity] + parents_of[entity]:
+                if voisin not in placed:
+                    heapq.heappush(frontier, (-connections[voisin], rank[voisin], voisin))
+
+    return entity_order
+
+def build_clusters(entity_order, parents_of):
+    """ÉTAPE 3 : cluster de chaque entité (ses parents > elle-même)"""
+    clusters = {}
+
+    for iteration, entity_name in enumerate(entity_order, 1):
+        # Construire le cluster
+        cluster_left = []
+        cluster_right = [entity_name]
+
+        for a in parents_of[entity_name]:
+            if a not in cluster_left:
+                cluster_left.append(a)
+
+        clusters[entity_name] = {
+            'left': cluster_left,
+            'right': cluster_right
+        }
+
+        emit(f"{iteration}) Cluster '{entity_name}':")
+        emit(f"   {cluster_left} > {cluster_right}")
+
+    return clusters
+
+def build_layers(entity_order, clusters, parents_of, children_of, neighbors):
+    """ÉTAPE 4 : placement des clusters en layers (ancre gauche/droite, cascade)"""
+    layers = []
+
+    # Index maintenus en parallèle de `layers` pendant l'ÉTAPE 4 :
+    # toute modification de `layers` passe par les helpers ci-dessous
+    layer_index_of = {}  # entité -> index de son layer
+    layer_members = []  # set des entités de chaque layer (parallèle à layers)
+    layer_neighbor_union = []  # union des voisins des entités de chaque layer
+
+    def neighbor_union(entities):
+        """Union des voisins d'un groupe d'entités"""
+        union = set()
+        for e in entities:
+            union |= neighbors[e]
+        return union
+
+    def find_layer_index(entity):
+        """Trouve l'index du layer contenant l'entité"""
+        return layer_index_of.get(entity)
+
+    def remove_from_layers(entity):
+        """Supprime une entité de son layer"""
+        idx = layer_index_of.pop(entity, None)
         if idx is not None:
-            anchor = e
-            anchor_layer = idx
-            anchor_location = 'right'
-            break
-
-    # Chercher dans LEFT
-    if anchor is None:
-        for e in cluster_left:
+            layers[idx].remove(entity)
+            layer_members[idx].discard(entity)
+            # Un voisin peut être partagé : reconstruire l'union du layer
+            layer_neighbor_union[idx] = neighbor_union(layers[idx])
+
+    def add_to_layer(entity, layer_idx):
+        """Ajoute une entité à la fin d'un layer existant"""
+        layers[layer_idx].append(entity)
+        layer_members[layer_idx].add(entity)
+        layer_neighbor_union[layer_idx] |= neighbors[entity]
+        layer_index_of[entity] = layer_idx
+
+    def append_layer(entities):
+        """Crée un nouveau layer à droite et retourne son index"""
+        layer_idx = len(layers)
+        layers.append(list(entities))
+        layer_members.append(set(entities))
+        layer_neighbor_union.append(neighbor_union(entities))
+        for e in entities:
+            layer_index_of[e] = layer_idx
+        return layer_idx
+
+    def prepend_layers(new_layers):
+        """Insère des layers à gauche (décale les index existants)"""
+        shift = len(new_layers)
+        for e in layer_index_of:
+            layer_index_of[e] += shift
+        layers[:0] = [list(layer) for layer in new_layers]
+        layer_members[:0] = [set(layer) for layer in new_layers]
+        layer_neighbor_union[:0] = [neighbor_union(layer) for layer in new_layers]
+        for idx, layer in enumerate(new_layers):
+            for e in layer:
+                layer_index_of[e] = idx
+
+    def can_add_to_layer(entity, layer_idx):
+        """Vérifie si on peut ajouter une entité à un layer"""
+        if layer_idx >= len(layers):
+            return True
+
+        # Vérifier qu'il n'y a pas de relation avec les entités du layer :
+        # les relations sont symétriques dans `neighbors`, un seul test suffit
+        return entity not in layer_neighbor_union[layer_idx]
+
+    def move_entity_to_right_of_parent(parent_entity, child_entity):
+        """
+        Déplace child_entity à droite de parent_entity.
+        Retourne le nouveau layer_idx de child_entity.
+        """
+        parent_layer = find_layer_index(parent_entity)
+        if parent_layer is None:
+            return None
+
+        # Supprimer child de son layer actuel
+        remove_from_layers(child_entity)
+
+        # Chercher un layer à droite du parent où on peut placer child
+        for layer_idx in range(parent_layer + 1, len(layers)):
+            if can_add_to_layer(child_entity, layer_idx):
+                add_to_layer(child_entity, layer_idx)
+                return layer_idx
+
+        # Aucun layer compatible trouvé : créer un nouveau layer
+        return append_layer([child_entity])
+
+    # Traiter chaque entité
+    for iteration, entity_name in enumerate(entity_order, 1):
+        emit(f"{iteration}) Entité '{entity_name}':")
+
+        cluster_left = clusters[entity_name]['left']
+        cluster_right = clusters[entity_name]['right']
+
+        emit(f"cluster-{entity_name} > {cluster_left} > {cluster_right}")
+        emit()
+
+        # Premier cluster
+        if not layers:
+            if cluster_left:
+                append_layer(cluster_left)
+            append_layer(cluster_right)
+            if VERBOSE:
+                emit(f"=>")
+                for idx, layer in enumerate(layers):
+                    emit(f"Layer {idx}: {layer}")
+                emit()
+            continue
+
+        # Chercher une ancre
+        anchor = None
+        anchor_layer = None
+        anchor_location = None
+
+        # Chercher dans RIGHT
+        for e in cluster_right:
             idx = find_layer_index(e)
             if idx is not None:
                 anchor = e
                 anchor_layer = idx
-                anchor_location = 'left'
+                anchor_location = 'right'
                 break
 
-    # Pas d'ancre
-    if anchor is None:
-        new_layers = []
-        if cluster_left:
-            new_layers.append(cluster_left[:])
-        new_layers.append(cluster_right[:])
-        layers[:0] = new_layers
-        print(f"=>")
-        for idx, layer in enumerate(layers):
-            print(f"Layer {idx}: {layer}")
-        print()
-        continue
-
-    print()
-
-    if anchor_location == 'right':
-        # RIGHT (entity_name) existe déjà
-        # NOUVELLE LOGIQUE: Détecter les conflits de position
-
-        print(f"  entity_name '{entity_name}' already exists")
-
-        # Détecter les conflits
-        entity_layer = find_layer_index(entity_name)
-        must_reorganize = False
-        conflict_parents = []
-
-        for parent in cluster_left:
-            parent_layer = find_layer_index(parent)
-            if parent_layer is not None:
-                print(f"  Checking parent '{parent}' at Layer {parent_layer} vs entity at Layer {entity_layer}")
-                if parent_layer >= entity_layer:
-                    must_reorganize = True
-                    conflict_parents.append(parent)
-                    print(f"    [!] CONFLICT! Parent '{parent}' (Layer {parent_layer}) >= Entity (Layer {entity_layer})")
-
-        if not must_reorganize:
-            print(f"  [OK] No conflicts detected, skipping reorganization")
-        else:
-            print(f"  [REORGANIZING] due to conflicts with: {conflict_parents}")
-
-        # Si conflit ou si on doit toujours réorganiser (logique originale)
-        # On réorganise dans tous les cas pour le moment (pour compatibilité)
-
-        # 1. Identifier tous les enfants (descendants) de RIGHT
-        def get_children(parent):
-            """Retourne les enfants directs de parent"""
-            children = []
-            for a, b in relations:
-                if a == parent:
-                    children.append(b)
-            return children
-
-        def get_all_descendants(root):
-            """Retourne tous les descendants (récursif)"""
-            descendants = []
-            visited = set()
-            queue = [root]
-
-            while queue:
-                current = queue.pop(0)
-                if current in visited:
-                    continue
-                visited.add(current)
-
-                children = get_children(current)
-                for child in children:
-                    if child not in descendants:
-                        descendants.append(child)
-                        queue.append(child)
-
-            return descendants
-
-        # 2. Supprimer RIGHT et tous ses descendants
-        descendants = get_all_descendants(entity_name)
-        print(f"  Removing {entity_name} and descendants: {descendants}")
-        remove_from_layers(entity_name)
-        for desc in descendants:
-            remove_from_layers(desc)
-
-        # 3. Placer les entités de LEFT (si elles ne sont pas déjà placées)
-        for left_entity in cluster_left:
-            if find_layer_index(left_entity) is None:
-                print(f"  Placing unplaced parent: {left_entity}")
-                # Chercher un layer compatible
-                placed = False
-                for layer_idx in range(len(layers)):
-                    if can_add_to_layer(left_entity, layer_idx):
-                        layers[layer_idx].append(left_entity)
-                        placed = True
-                        print(f"    -> Added to Layer {layer_idx}")
-                        break
-
-                if not placed:
-                    layers.append([left_entity])
-                    print(f"    -> Created new Layer {len(layers)-1}")
-
-        # 4. Trouver le layer max des LEFT
-        left_layers = [find_layer_index(e) for e in cluster_left if find_layer_index(e) is not None]
-        if left_layers:
-            max_left_layer = max(left_layers)
-        else:
-            max_left_layer = -1
-
-        print(f"  Max parent layer: {max_left_layer}")
+        # Chercher dans LEFT
+        if anchor is None:
+            for e in cluster_left:
+                idx = find_layer_index(e)
+                if idx is not None:
+                    anchor = e
+                    anchor_layer = idx
+                    anchor_location = 'left'
+                    break
+
+        # Pas d'ancre
+        if anchor is None:
+            new_layers = []
+            if cluster_left:
+                new_layers.append(cluster_left[:])
+            new_layers.append(cluster_right[:])
+            prepend_layers(new_layers)
+            if VERBOSE:
+                emit(f"=>")
+                for idx, layer in enumerate(layers):
+                    emit(f"Layer {idx}: {layer}")
+                emit()
+            continue
+
+        emit()
+
+        if anchor_location == 'right':
+            # RIGHT (entity_name) existe déjà
+            # NOUVELLE LOGIQUE: Détecter les conflits de position
+
+            emit(f"  entity_name '{entity_name}' already exists")
+
+            # Détecter les conflits
+            entity_layer = find_layer_index(entity_name)
+            must_reorganize = False
+            conflict_parents = []
+
+            for parent in cluster_left:
+                parent_layer = find_layer_index(parent)
+                if parent_layer is not None:
+                    emit(f"  Checking parent '{parent}' at Layer {parent_layer} vs entity at Layer {entity_layer}")
+                    if parent_layer >= entity_layer:
+                        must_reorganize = True
+                        conflict_parents.append(parent)
+                        emit(f"    [!] CONFLICT! Parent '{parent}' (Layer {parent_layer}) >= Entity (Layer {entity_layer})")
+
+            if not must_reorganize:
+                emit(f"  [OK] No conflicts detected, skipping reorganization")
+            else:
+                emit(f"  [REORGANIZING] due to conflicts with: {conflict_parents}")
+
+            # Si conflit ou si on doit toujours réorganiser (logique originale)
+            # On réorganise dans tous les cas pour le moment (pour compatibilité)
+
+            # 1. Identifier tous les enfants (descendants) de RIGHT
+            def get_children(parent):
+                """Retourne les enfants directs de parent"""
+                return children_of[parent]
+
+            def get_all_descendants(root):
+                """
+                Retourne tous les descendants (BFS) et leur niveau depuis root.
+                Le niveau est fixé à la découverte : pas de second BFS pour le cascade.
+                """
+                descendants = []
+                seen = set()
+                level_map = {root: 0}
+                queue = deque([root])
+
+                while queue:
+                    current = queue.popleft()
+                    children = get_children(current)
+                    for child in children:
+                        if child not in seen:
+                            seen.add(child)
+                            descendants.append(child)
+                            level_map.setdefault(child, level_map[current] + 1)
+                            queue.append(child)
+
+                return descendants, level_map
+
+            # 2. Supprimer RIGHT et tous ses descendants
+            descendants, level_map = get_all_descendants(entity_name)
+            emit(f"  Removing {entity_name} and descendants: {descendants}")
+            remove_from_layers(entity_name)
+            for desc in descendants:
+                remove_from_layers(desc)
+
+            # 3. Placer les entités de LEFT (si elles ne sont pas déjà placées)
+            for left_entity in cluster_left:
+                if find_layer_index(left_entity) is None:
+                    emit(f"  Placing unplaced parent: {left_entity}")
+                    # Chercher un layer compatible
+                    placed = False
+                    for layer_idx in range(len(layers)):
+                        if can_add_to_layer(left_entity, layer_idx):
+                            add_to_layer(left_entity, layer_idx)
+                            placed = True
+                            emit(f"    -> Added to Layer {layer_idx}")
+                            break
 
-        # 5. Placer RIGHT à droite du max LEFT
-        right_placed_layer = None
-        for layer_idx in range(max_left_layer + 1, len(layers)):
-            if can_add_to_layer(entity_name, layer_idx):
-                layers[layer_idx].append(entity_name)
-                right_placed_layer = layer_idx
-                print(f"  Placed {entity_name} at Layer {layer_idx}")
-                break
+                    if not placed:
+                        emit(f"    -> Created new Layer {append_layer([left_entity])}")
 
-        if right_placed_layer is None:
-            layers.append([entity_name])
-            right_placed_layer = len(layers) - 1
-            print(f"  Created new Layer {right_placed_layer} for {entity_name}")
-
-        # 6. Replacer les descendants en cascade
-        # Pour chaque descendant, le parent le déplace à sa droite
-        # On traite par niveaux (BFS)
-        if descendants:
-            print(f"  Cascading descendants: {descendants}")
-            # Organiser par niveaux
-            level_map = {entity_name: 0}
-            queue = [entity_name]
-
-            while queue:
-                current = queue.pop(0)
-                current_level = level_map[current]
-                children = get_children(current)
-
-                for child in children:
-                    if child in descendants and child not in level_map:
-                        level_map[child] = current_level + 1
-                        queue.append(child)
-
-            # Trier descendants par niveau
-            descendants_sorted = sorted(descendants, key=lambda x: level_map.get(x, 999))
-
-            # Placer chaque descendant
-            for desc in descendants_sorted:
-                # Trouver le parent dans la relation
-                parent = None
-                for a, b in relations:
-                    if b == desc and (a == entity_name or a in descendants_sorted):
-                        parent_layer = find_layer_index(a)
-                        if parent_layer is not None:
+            # 4. Trouver le layer max des LEFT
+            # Un seul find_layer_index par parent, sans liste intermédiaire
+            max_left_layer = -1
+            for e in cluster_left:
+                idx = find_layer_index(e)
+                if idx is not None and idx > max_left_layer:
+                    max_left_layer = idx
+
+            emit(f"  Max parent layer: {max_left_layer}")
+
+            # 5. Placer RIGHT à droite du max LEFT
+            right_placed_layer = None
+            for layer_idx in range(max_left_layer + 1, len(layers)):
+                if can_add_to_layer(entity_name, layer_idx):
+                    add_to_layer(entity_name, layer_idx)
+                    right_placed_layer = layer_idx
+                    emit(f"  Placed {entity_name} at Layer {layer_idx}")
+                    break
+
+            if right_placed_layer is None:
+                right_placed_layer = append_layer([entity_name])
+                emit(f"  Created new Layer {right_placed_layer} for {entity_name}")
+
+            # 6. Replacer les descendants en cascade
+            # Pour chaque descendant, le parent le déplace à sa droite
+            # On traite par niveaux (BFS)
+            if descendants:
+                emit(f"  Cascading descendants: {descendants}")
+                # Organiser par niveaux (level_map vient du BFS de l'étape 2)
+                # Trier descendants par niveau
+                descendants_sorted = sorted(descendants, key=level_map.__getitem__)
+
+                # Parents admissibles : RIGHT ou un autre descendant
+                allowed_parents = set(descendants)
+                allowed_parents.add(entity_name)
+
+                # Placer chaque descendant
+                for desc in descendants_sorted:
+                    # Trouver le parent (déjà placé) parmi les parents directs
+                    parent = None
+                    for a in parents_of[desc]:
+                        if a in allowed_parents and find_layer_index(a) is not None:
                             parent = a
                             break
 
-                if parent:
-                    new_layer = move_entity_to_right_of_parent(parent, desc)
-                    print(f"    Moved {desc} to Layer {new_layer} (right of {parent})")
-
-    else:  # anchor_location == 'left'
-        # LEFT existe déjà
-
-        # Identifier les pivots
-        pivots = []
-        for e in cluster_left:
-            if e != anchor and find_layer_index(e) is not None:
-                pivots.append(e)
-
-        # Ajouter les non-pivots au layer de l'ancre
-        anchor_layer = find_layer_index(anchor)
-        for e in cluster_left:
-            if e != anchor and e not in pivots and e not in layers[anchor_layer]:
-                layers[anchor_layer].append(e)
-
-        # Placer RIGHT à droite de l'ancre
-        right_placed = False
-        for layer_idx in range(anchor_layer + 1, len(layers)):
-            if can_add_to_layer(entity_name, layer_idx):
-                layers[layer_idx].append(entity_name)
-                right_placed = True
-                break
-
-        if not right_placed:
-            layers.append([entity_name])
-
-    print(f"=>")
-    for idx, layer in enumerate(layers):
-        print(f"Layer {idx}: {layer}")
-    print()
-
-# Nettoyer les layers vides
-layers = [layer for layer in layers if layer]
-
-print("\n=== LAYERS APRÈS ÉTAPE 4 ===\n")
-for idx, layer in enumerate(layers):
-    print(f"Layer {idx}: {layer}")
-
-# === ÉTAPE 6 : REORDER ELEMENTS WITHIN LAYERS ===
-print("\n=== ÉTAPE 6 : RÉORGANISATION VERTICALE PAR CLUSTER ===\n")
-
-def reorder_layers_by_cluster():
+                    if parent:
+                        new_layer = move_entity_to_right_of_parent(parent, desc)
+                        emit(f"    Moved {desc} to Layer {new_layer} (right of {parent})")
+
+        else:  # anchor_location == 'left'
+            # LEFT existe déjà
+
+            # Identifier les pivots
+            pivots = []
+            for e in cluster_left:
+                if e != anchor and find_layer_index(e) is not None:
+                    pivots.append(e)
+
+            # Ajouter les non-pivots au layer de l'ancre
+            anchor_layer = find_layer_index(anchor)
+            for e in cluster_left:
+                if e != anchor and e not in pivots and e not in layer_members[anchor_layer]:
+                    add_to_layer(e, anchor_layer)
+
+            # Placer RIGHT à droite de l'ancre
+            right_placed = False
+            for layer_idx in range(anchor_layer + 1, len(layers)):
+                if can_add_to_layer(entity_name, layer_idx):
+                    add_to_layer(entity_name, layer_idx)
+                    right_placed = True
+                    break
+
+            if not right_placed:
+                append_layer([entity_name])
+
+        if VERBOSE:
+            emit(f"=>")
+            for idx, layer in enumerate(layers):
+                emit(f"Layer {idx}: {layer}")
+            emit()
+
+    # Nettoyer les layers vides (layer_index_of / layer_members / layer_neighbor_union ne servent plus après l'ÉTAPE 4)
+    return [layer for layer in layers if layer]
+
+def reorder_layers_by_cluster(layers, entity_order, order_rank, children_of):
     """
     Réorganise les entités dans chaque layer selon l'organisation en clusters.
 
@@ -458,14 +550,12 @@ def reorder_layers_by_cluster():
     Algorithme:
     1. Dernier layer: ordre selon entity_order
     2. Autres layers (de droite à gauche):
-       - Pour chaque entité du layer suivant (dans l'ordre):
-         - Grouper toutes les entités du layer actuel qui pointent vers elle (même cluster)
+       - Chaque entité est placée au barycentre (position moyenne) de ses
+         cibles dans le layer suivant : les entités d'un même cluster se suivent
        - Les entités sans connexion au layer suivant viennent en premier
     """
-    global layers
-
     if not layers:
-        return
+        return layers
 
     # Layer le plus à droite: ordonner selon entity_order
     last_layer_idx = len(layers) - 1
@@ -483,71 +573,144 @@ def reorder_layers_by_cluster():
             ordered_last.append(entity)
 
     layers[last_layer_idx] = ordered_last
-    print(f"Layer {last_layer_idx}: {last_layer} > {ordered_last}")
+    emit(f"Layer {last_layer_idx}: {last_layer} > {ordered_last}")
 
     # Traiter les autres layers de droite à gauche
     for layer_idx in range(len(layers) - 2, -1, -1):
         current_layer = layers[layer_idx]
         next_layer = layers[layer_idx + 1]
+        pos_in_next = {e: i for i, e in enumerate(next_layer)}
 
-        print(f"\nLayer {layer_idx}: {current_layer}")
+        emit(f"\nLayer {layer_idx}: {current_layer}")
 
         # NOUVELLE LOGIQUE: Trouver TOUTES les cibles pour chaque entité
         entity_to_all_targets = {}
         for entity in current_layer:
             targets = []
-            for a, b in relations:
-                if a == entity and b in next_layer:
+            for b in children_of[entity]:
+                if b in pos_in_next:
                     targets.append(b)
             entity_to_all_targets[entity] = targets
 
-        print(f"   Connexions multiples: {entity_to_all_targets}")
+        if VERBOSE:
+            emit(f"   Connexions multiples: {entity_to_all_targets}")
 
-        # NOUVELLE STRATÉGIE: Ordonner par la position MAXIMALE de leurs cibles
+        # STRATÉGIE: Ordonner par BARYCENTRE de leurs cibles (méthode barycentrique)
         # Entités pointant vers des cibles plus tôt viennent avant les entités pointant vers des cibles plus tard
 
-        # 1. Calculer pour chaque entité la position max de ses cibles
-        entity_max_target_pos = {}
+        # 1. Calculer pour chaque entité la position moyenne de ses cibles
+        entity_barycenter = {}
         for entity in current_layer:
             targets = entity_to_all_targets[entity]
             if not targets:
-                entity_max_target_pos[entity] = -1  # Pas de cible = vient en premier
+                entity_barycenter[entity] = -1  # Pas de cible = vient en premier
             else:
-                max_pos = max(next_layer.index(t) for t in targets)
-                entity_max_target_pos[entity] = max_pos
+                positions = [pos_in_next[t] for t in targets]
+                entity_barycenter[entity] = sum(positions) / len(positions)
 
-        print(f"   Max target positions: {entity_max_target_pos}")
+        if VERBOSE:
+            emit(f"   Barycentres: {entity_barycenter}")
 
-        # 2. Trier les entités par position maximale de cible
-        ordered_layer = sorted(current_layer, key=lambda e: (
-            entity_max_target_pos[e],
-            entity_order.index(e) if e in entity_order else 999
-        ))
+        # 2. Trier les entités par barycentre
+        # Clés calculées une fois par entité (decorate-sort-undecorate) ;
+        # la position courante départage les égalités comme un tri stable
+        keys = [(entity_barycenter[e], order_rank.get(e, 999), idx, e)
+                for idx, e in enumerate(current_layer)]
+        keys.sort()
+        ordered_layer = [e for _, _, _, e in keys]
 
         # Log clusters for debugging
-        for target_entity in next_layer:
-            entities_pointing_to_target = [e for e in current_layer
-                                          if target_entity in entity_to_all_targets[e]]
-            if entities_pointing_to_target:
-                print(f"   Cluster > {target_entity}: {entities_pointing_to_target}")
+        if VERBOSE:
+            for target_entity in next_layer:
+                entities_pointing_to_target = [e for e in current_layer
+                                              if target_entity in entity_to_all_targets[e]]
+                if entities_pointing_to_target:
+                    emit(f"   Cluster > {target_entity}: {entities_pointing_to_target}")
 
         layers[layer_idx] = ordered_layer
-        print(f"   => {ordered_layer}")
-
-reorder_layers_by_cluster()
-
-print("\n=== RÉSULTAT FINAL AVEC ORGANISATION VERTICALE ===\n")
-for idx, layer in enumerate(layers):
-    print(f"Layer {idx}: {layer}")
-
-print("\n=== VISUALISATION 2D ===\n")
-max_entities = max(len(layer) for layer in layers)
-for row in range(max_entities):
-    line = ""
-    for layer in layers:
-        if row < len(layer):
-            entity = layer[row]
-            line += f"{entity:20}"
-        else:
-            line += " " * 20
-    print(line)
+        emit(f"   => {ordered_layer}")
+
+    return layers
+
+# === VISUALISATION 2D ===
+# Rendu séparé du calcul : les layers sont déjà définitifs ici, un appelant
+# qui ne veut que le placement l'évite avec main(..., render=False)
+
+def render_layers(layers, column_width=20):
+    """Affiche les layers en colonnes (un layer par colonne)"""
+    emit("\n=== VISUALISATION 2D ===\n")
+    max_entities = max((len(layer) for layer in layers), default=0)
+    blank = " " * column_width
+    for row in range(max_entities):
+        emit("".join(f"{layer[row]:{column_width}}" if row < len(layer) else blank
+                     for layer in layers))
+
+def main(dsl=None, entity_order=None, render=True):
+    """
+    Exécute toutes les étapes sur un DSL (par défaut relations_input).
+    entity_order : ordre de traitement. Par défaut, celui écrit pour
+    relations_input si aucun DSL n'est donné, sinon celui dérivé des
+    relations du DSL (build_entity_order).
+    render : False pour obtenir les layers sans la visualisation 2D.
+    """
+    if dsl is None:
+        dsl = relations_input
+        if entity_order is None:
+            entity_order = DEFAULT_ENTITY_ORDER
+    relations = parse_relations(dsl)
+
+    emit("=== ÉTAPE 1 : RELATIONS DÉTECTÉES ===")
+    for a, b in relations:
+        emit(f"{a} > {b}")
+    flush_output()
+
+    # Aucune relation (DSL vide ou uniquement des commentaires) : rien à placer
+    if not relations:
+        return []
+
+    parents_of, children_of, neighbors = build_adjacency(relations)
+
+    # === ÉTAPE 2 : ORDRE DES RELATIONS ===
+    if entity_order is None:
+        entity_order = build_entity_order(relations, parents_of, children_of)
+    entity_order = list(entity_order)
+
+    # Rang de chaque entité dans entity_order (remplace entity_order.index dans les tris)
+    order_rank = {e: i for i, e in enumerate(entity_order)}
+
+    emit("\n=== ÉTAPE 2 : ORDRE DES ENTITÉS ===")
+    emit(f"Ordre: {' > '.join(entity_order)}")
+    flush_output()
+
+    # === ÉTAPE 3 : BUILD CLUSTERS ===
+    emit("\n=== ÉTAPE 3 : BUILD CLUSTERS ===\n")
+    clusters = build_clusters(entity_order, parents_of)
+    flush_output()
+
+    # === ÉTAPE 4 : BUILD LAYERS ===
+    emit("\n=== ÉTAPE 4 : BUILD LAYERS ===\n")
+    layers = build_layers(entity_order, clusters, parents_of, children_of, neighbors)
+
+    emit("\n=== LAYERS APRÈS ÉTAPE 4 ===\n")
+    for idx, layer in enumerate(layers):
+        emit(f"Layer {idx}: {layer}")
+    flush_output()
+
+    # === ÉTAPE 6 : REORDER ELEMENTS WITHIN LAYERS ===
+    emit("\n=== ÉTAPE 6 : RÉORGANISATION VERTICALE PAR CLUSTER ===\n")
+    layers = reorder_layers_by_cluster(layers, entity_order, order_rank, children_of)
+    flush_output()
+
+    emit("\n=== RÉSULTAT FINAL AVEC ORGANISATION VERTICALE ===\n")
+    for idx, layer in enumerate(layers):
+        emit(f"Layer {idx}: {layer}")
+
+    if render:
+        render_layers(layers)
+    flush_output()
+
+    return layers
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,8 @@ Expected gain: 30-40% faster than algo9 (targeting the critical propagation loop
 
 from collections import defaultdict
 
+_OPERATORS = ('<>', '->', '>', '<', '-')
+
 # === DONNÉES DE TEST ===
 relations_input_crm = """
 // USER/ORGANIZATION
@@ -315,11 +317,13 @@ class LayerClassifier:
             connections[right] += 1
         return dict(connections)
 
-    def compute_layers(self, entity_order):
+    def compute_layers(self, entity_order, connection_count=None):
         """Calcule les layers en utilisant l'entité la plus connectée comme référence
 
         Args:
             entity_order: The processing order of entities from Step 2
+            connection_count: Connection count per entity from Step 2, computed
+                on the same relations (None: counted here)
         """
         if not self.entities:
             return []
@@ -328,7 +332,11 @@ class LayerClassifier:
         self._update_distances_step_by_step(entity_order)
 
         # Étape 1: Trouver l'entité la plus connectée (avec cascade de critères en cas d'égalité)
-        connections = self._count_connections()
+        # Réutilise le comptage de l'ÉTAPE 2 s'il a été fourni
+        if connection_count is not None:
+            connections = connection_count
+        else:
+            connections = self._count_connections()
 
         # Cascade de critères pour choisir la référence:
         # 1. Nombre de connexions directes (critère primaire)
@@ -358,14 +366,16 @@ class LayerClassifier:
         log(f"Entite de reference: {reference_entity} ({connections[reference_entity]} connexions, somme voisins: {ref_score[1]})")
 
         # Étape 2: Trier les relations par connectivité
+        # Triplets plats (left, right, distance): la boucle de propagation
+        # déballe un seul tuple par relation
         sorted_distances = sorted(
-            self.distances.items(),
-            key=lambda item: connections[item[0][0]] + connections[item[0][1]],
+            [(left, right, distance) for (left, right), distance in self.distances.items()],
+            key=lambda item: connections[item[0]] + connections[item[1]],
             reverse=True
         )
 
         log(f"=== Relations triees par connectivite ===")
-        for idx, ((left, right), distance) in enumerate(sorted_distances[:15], 1):
+        for idx, (left, right, distance) in enumerate(sorted_distances[:15], 1):
             conn_sum = connections[left] + connections[right]
             log(f"{idx}. {left}({connections[left]}) r {right}({connections[right]}) = {conn_sum} connexions")
 
@@ -380,7 +390,7 @@ class LayerClassifier:
             iteration += 1
             progress = False
 
-            for (left, right), distance in sorted_distances:
+            for left, right, distance in sorted_distances:
                 if left in layers and right not in layers:
                     layers[right] = layers[left] + distance
                     progress = True
@@ -396,9 +406,11 @@ class LayerClassifier:
                         progress = True
 
             if not progress:
-                for entity in self.entities:
-                    if entity not in layers:
-                        layers[entity] = 0
+                # Entités non atteintes depuis la référence: layer 0 en une
+                # seule passe, ce qui complète layers et termine la boucle
+                layers.update(dict.fromkeys(
+                    [entity for entity in self.entities if entity not in layers], 0))
+                break
 
         # Afficher résumé
         log(f"========================================")
@@ -444,9 +456,8 @@ logTitle("ÉTAPE 0 : PARSER LES RELATIONS")
 
 def extract_table_name(field_ref):
     """Extrait le nom de la table depuis une référence de champ"""
-    if '.' in field_ref:
-        return field_ref.split('.')[0]
-    return field_ref
+    # partition s'arrête au premier point, sans construire de liste
+    return field_ref.partition('.')[0]
 
 relations_raw = []
 for line in relations_input.strip().split('\n'):
@@ -454,31 +465,18 @@ for line in relations_input.strip().split('\n'):
     if not line or line.startswith('//'):
         continue
 
-    if '<>' in line:
-        parts = line.split('<>')
-        a = extract_table_name(parts[0].strip())
-        b = extract_table_name(parts[1].strip())
-        relations_raw.append((a, b))
-    elif '->' in line:
-        parts = line.split('->')
-        a = extract_table_name(parts[0].strip())
-        b = extract_table_name(parts[1].strip())
-        relations_raw.append((a, b))
-    elif '>' in line:
-        parts = line.split('>')
-        a = extract_table_name(parts[0].strip())
-        b = extract_table_name(parts[1].strip())
-        relations_raw.append((a, b))
-    elif '<' in line:
-        parts = line.split('<')
-        a = extract_table_name(parts[0].strip())
-        b = extract_table_name(parts[1].strip())
-        relations_raw.append((a, b))  # Left entity stays left regardless of arrow direction
-    elif '-' in line:
-        parts = line.split('-')
-        a = extract_table_name(parts[0].strip())
-        b = extract_table_name(parts[1].strip())
-        relations_raw.append((a, b))
+    # Operator chosen by priority (<>, ->, >, <, -), not by position; whatever
+    # the symbol, the left entity stays left of the right one
+    for operator in _OPERATORS:
+        index = line.find(operator)
+        if index != -1:
+            break
+    else:
+        continue
+    a = extract_table_name(line[:index].strip())
+    # The right side stops at the next occurrence of the same operator
+    b = extract_table_name(line[index + len(operator):].partition(operator)[0].strip())
+    relations_raw.append((a, b))
 
 log(f"Relations parsees: {len(relations_raw)}")
 for a, b in relations_raw[:10]:
@@ -495,7 +493,7 @@ unique_relations = []
 duplicates_removed = []
 
 for a, b in relations_raw:
-    pair_key = frozenset({a, b})
+    pair_key = (a, b) if a <= b else (b, a)  # Order-agnostic, no set allocation
 
     if pair_key not in seen_pairs:
         seen_pairs[pair_key] = (a, b)
@@ -527,36 +525,49 @@ liste_regle_1 = sorted(connection_count.keys(),
                        key=lambda x: connection_count[x],
                        reverse=True)
 
+# Position de chaque entité dans liste_regle_1 (départage sans list.index)
+regle_1_pos = {e: i for i, e in enumerate(liste_regle_1)}
+
+# Voisins de chaque entité (ordre des relations conservé), construits une
+# seule fois au lieu de re-parcourir toutes les relations à chaque itération
+voisins = defaultdict(list)
+for a, b in relations:
+    voisins[a].append(b)
+    voisins[b].append(a)
+
 entity_order = []
 liste_enonces = []
+# Ensembles miroirs pour les tests d'appartenance (les listes gardent l'ordre)
+entity_order_set = set()
+liste_enonces_set = set()
 
 # ITERATION 1: Prendre le premier élément (le plus connecté)
 entity_order.append(liste_regle_1[0])
+entity_order_set.add(liste_regle_1[0])
 
 # Ajouter les entités connectées
-for a, b in relations:
-    if a == entity_order[0] and b not in liste_enonces:
-        liste_enonces.append(b)
-    if b == entity_order[0] and a not in liste_enonces:
-        liste_enonces.append(a)
+for voisin in voisins[entity_order[0]]:
+    if voisin not in liste_enonces_set:
+        liste_enonces_set.add(voisin)
+        liste_enonces.append(voisin)
 
 # ITERATIONS suivantes
 while len(entity_order) < len(liste_regle_1):
-    candidates = [e for e in liste_enonces if e not in entity_order]
+    candidates = [e for e in liste_enonces if e not in entity_order_set]
     if not candidates:
         break
 
     next_entity = max(candidates,
                       key=lambda e: (connection_count[e],
-                                    -liste_regle_1.index(e)))
+                                    -regle_1_pos[e]))
 
     entity_order.append(next_entity)
+    entity_order_set.add(next_entity)
 
-    for a, b in relations:
-        if a == next_entity and b not in liste_enonces and b not in entity_order:
-            liste_enonces.append(b)
-        if b == next_entity and a not in liste_enonces and a not in entity_order:
-            liste_enonces.append(a)
+    for voisin in voisins[next_entity]:
+        if voisin not in liste_enonces_set and voisin not in entity_order_set:
+            liste_enonces_set.add(voisin)
+            liste_enonces.append(voisin)
 
 log(f"Ordre: {' > '.join(entity_order)}")
 
@@ -607,7 +618,7 @@ for left, right in relations:
     final_classifier.add_relation(left, right)
 
 # Build final layers using entity_order for step-by-step distance calculation
-final_layers = final_classifier.compute_layers(entity_order)
+final_layers = final_classifier.compute_layers(entity_order, dict(connection_count))
 final_classifier.final_layers = final_layers
 
 log(f"\n=== RESULTAT AVANT RÉORGANISATION ===")
@@ -626,6 +637,10 @@ def reorder_layers_by_cluster(layers, relations, entity_order):
     if not layers:
         return layers
 
+    # Position de chaque entité dans entity_order, calculée une fois pour tous
+    # les tris (au lieu de entity_order.index)
+    entity_order_pos = {e: i for i, e in enumerate(entity_order)}
+
     # Dernier layer: ordre selon entity_order
     last_layer_idx = len(layers) - 1
     last_layer = layers[last_layer_idx]
@@ -645,13 +660,15 @@ def reorder_layers_by_cluster(layers, relations, entity_order):
     for layer_idx in range(len(layers) - 2, -1, -1):
         current_layer = layers[layer_idx]
         next_layer = layers[layer_idx + 1]
+        # Position dans next_layer (remplace next_layer.index et `in next_layer`)
+        next_pos = {e: i for i, e in enumerate(next_layer)}
 
         # Trouver les cibles pour chaque entité
         entity_to_all_targets = {}
         for entity in current_layer:
             targets = []
             for a, b in relations:
-                if a == entity and b in next_layer:
+                if a == entity and b in next_pos:
                     targets.append(b)
             entity_to_all_targets[entity] = targets
 
@@ -662,7 +679,7 @@ def reorder_layers_by_cluster(layers, relations, entity_order):
             targets = entity_to_all_targets[entity]
             if targets:
                 # Prendre la première cible comme cible principale (ou celle avec position min)
-                primary = min(targets, key=lambda t: next_layer.index(t))
+                primary = min(targets, key=next_pos.__getitem__)
                 entity_primary_target[entity] = primary
             else:
                 entity_primary_target[entity] = None
@@ -674,7 +691,7 @@ def reorder_layers_by_cluster(layers, relations, entity_order):
             if primary is None:
                 entity_target_pos[entity] = -1
             else:
-                entity_target_pos[entity] = next_layer.index(primary)
+                entity_target_pos[entity] = next_pos[primary]
 
         # Grouper les entités par leur cible principale
         # Créer des groupes: {target: [entities]}
@@ -688,13 +705,13 @@ def reorder_layers_by_cluster(layers, relations, entity_order):
         # Trier chaque groupe par entity_order
         for target in target_groups:
             target_groups[target] = sorted(target_groups[target], key=lambda e: (
-                entity_order.index(e) if e in entity_order else 999
+                entity_order_pos.get(e, 999)
             ))
 
         # Ordonner les groupes par position de leur cible dans next_layer
         # Les entités sans cible (None) vont en premier
         ordered_targets = sorted(target_groups.keys(), key=lambda t: (
-            next_layer.index(t) if t is not None else -1
+            next_pos[t] if t is not None else -1
         ))
 
         # Construire la liste finale
@@ -17,7 +17,7 @@ Performance target:
 - Incremental remove: <0.2ms (2.5x faster)
 """
 
-from collections import defaultdict
+from collections import defaultdict, deque
 import time
 
 # === TEST DATA ===
@@ -87,6 +87,8 @@ audit_logs.performedBy > users.id
 api_keys.userId > users.id
 """
 
+# Hot paths test this flag before calling log(), so the f-string
+# arguments are not even built when debugging is off
 debug = False
 
 def log(info: str):
@@ -102,15 +104,23 @@ class LayerClassifier:
     """
     Incremental Layer Classifier with add/remove support
     """
+    # Fixed attribute set: no per-instance __dict__, faster attribute access
+    __slots__ = (
+        'relations', 'relation_counts', 'entities', 'distances',
+        'entity_reference_distances', 'clusters_cache', 'dependents_index',
+        'is_structure_dirty', 'cached_entity_order', 'cached_layers',
+    )
+
     def __init__(self):
         self.relations = []  # List of relations (left, right)
+        self.relation_counts = {}  # (left, right) -> occurrences in self.relations
         self.entities = set()  # All entities
         self.distances = {}  # Distances: (left, right) -> distance
-        self.entity_reference_distances = defaultdict(dict)  # entity -> {reference: distance}
+        self.entity_reference_distances = {}  # entity -> {reference: distance}
 
         # Caches (from algo10)
         self.clusters_cache = {}  # {entity: set(cluster_elements)}
-        self.dependents_index = defaultdict(set)  # {entity: {entities_that_depend_on_it}}
+        self.dependents_index = {}  # {entity: {entities_that_depend_on_it}}
 
         # NEW: Dirty tracking for incremental updates
         self.is_structure_dirty = True  # True if need to recalculate entity_order
@@ -120,6 +130,7 @@ class LayerClassifier:
     def add_relation(self, left, right):
         """Add relation with full recalculation (baseline)"""
         self.relations.append((left, right))
+        self.relation_counts[(left, right)] = self.relation_counts.get((left, right), 0) + 1
         self.entities.add(left)
         self.entities.add(right)
         self.distances[(left, right)] = 1
@@ -138,42 +149,54 @@ class LayerClassifier:
         Complexity: O(d) where d = affected dependents
         vs O(n×r) for full recalculation
         """
-        log(f"\n[INCREMENTAL ADD] {left} -> {right}")
+        if debug:
+            log(f"\n[INCREMENTAL ADD] {left} -> {right}")
 
         # 1. Add to structures
         self.relations.append((left, right))
+        self.relation_counts[(left, right)] = self.relation_counts.get((left, right), 0) + 1
         self.entities.add(left)
         self.entities.add(right)
         self.distances[(left, right)] = 1
 
         # 2. Update clusters cache incrementally
-        if right not in self.clusters_cache:
-            self.clusters_cache[right] = set()
-        self.clusters_cache[right].add(left)
+        cluster = self.clusters_cache.get(right)
+        if cluster is None:
+            self.clusters_cache[right] = {left}
+        else:
+            cluster.add(left)
 
         # 3. Update dependents index
-        if right not in self.dependents_index:
-            self.dependents_index[right] = set()
-        self.dependents_index[right].add(left)
+        dependents = self.dependents_index.get(right)
+        if dependents is None:
+            self.dependents_index[right] = {left}
+        else:
+            dependents.add(left)
 
         # 4. Initialize distance for new relation
-        if left not in self.entity_reference_distances:
-            self.entity_reference_distances[left] = {}
-        self.entity_reference_distances[left][right] = 1
+        # Rows are looked up once and then read/written in place
+        left_row = self.entity_reference_distances.get(left)
+        if left_row is None:
+            left_row = self.entity_reference_distances[left] = {}
+        left_row[right] = 1
 
         # 5. Propagate: left inherits all distances from right
-        if right in self.entity_reference_distances:
-            for ref, dist in self.entity_reference_distances[right].items():
+        right_row = self.entity_reference_distances.get(right)
+        if right_row is not None:
+            for ref, dist in right_row.items():
                 inherited_dist = 1 + dist
 
                 # Update if new path is longer (maximalité)
-                if ref not in self.entity_reference_distances[left]:
-                    self.entity_reference_distances[left][ref] = inherited_dist
-                    log(f"  [NEW] dist({left}, {ref}) = {inherited_dist}")
-                elif self.entity_reference_distances[left][ref] < inherited_dist:
-                    old = self.entity_reference_distances[left][ref]
-                    self.entity_reference_distances[left][ref] = inherited_dist
-                    log(f"  [UPDATE] dist({left}, {ref}) = {old} -> {inherited_dist}")
+                # Distances are >= 1, so 0 stands for "no path yet" and a
+                # single comparison covers both the new and the longer case
+                old = left_row.get(ref, 0)
+                if old < inherited_dist:
+                    left_row[ref] = inherited_dist
+                    if debug:
+                        if old:
+                            log(f"  [UPDATE] dist({left}, {ref}) = {old} -> {inherited_dist}")
+                        else:
+                            log(f"  [NEW] dist({left}, {ref}) = {inherited_dist}")
 
         # 6. Propagate to all dependents of 'left'
         self._propagate_new_relation(left, right)
@@ -181,7 +204,8 @@ class LayerClassifier:
         # Mark layers as dirty (need re-layout)
         self.cached_layers = None
 
-        log(f"[INCREMENTAL ADD] Complete")
+        if debug:
+            log(f"[INCREMENTAL ADD] Complete")
 
     def _propagate_new_relation(self, left, right):
         """
@@ -191,40 +215,49 @@ class LayerClassifier:
         - E can now reach 'right' via 'left'
         - E can also reach all references that 'right' can reach
         """
-        dependents_of_left = self.dependents_index.get(left, set())
+        dependents_of_left = self.dependents_index.get(left, ())
+        distances = self.entity_reference_distances
+
+        # No row is created below, so the row of 'right' can be fetched once
+        right_row = distances.get(right)
 
         for dependent in dependents_of_left:
-            if dependent not in self.entity_reference_distances:
+            dependent_row = distances.get(dependent)
+            if dependent_row is None:
                 continue
 
-            if left not in self.entity_reference_distances[dependent]:
+            dist_to_left = dependent_row.get(left)
+            if dist_to_left is None:
                 continue
 
-            dist_to_left = self.entity_reference_distances[dependent][left]
-
             # Dependent can reach 'right' via 'left'
+            # (also the offset added to every distance inherited from 'right')
             new_dist_to_right = dist_to_left + 1
 
-            if right not in self.entity_reference_distances[dependent]:
-                self.entity_reference_distances[dependent][right] = new_dist_to_right
-                log(f"  [PROPAGATE] dist({dependent}, {right}) = {new_dist_to_right}")
-            elif self.entity_reference_distances[dependent][right] < new_dist_to_right:
-                old = self.entity_reference_distances[dependent][right]
-                self.entity_reference_distances[dependent][right] = new_dist_to_right
-                log(f"  [PROPAGATE] dist({dependent}, {right}) = {old} -> {new_dist_to_right}")
+            old = dependent_row.get(right, 0)
+            if old < new_dist_to_right:
+                dependent_row[right] = new_dist_to_right
+                if debug:
+                    if old:
+                        log(f"  [PROPAGATE] dist({dependent}, {right}) = {old} -> {new_dist_to_right}")
+                    else:
+                        log(f"  [PROPAGATE] dist({dependent}, {right}) = {new_dist_to_right}")
 
             # Dependent can also reach all references that 'right' can reach
-            if right in self.entity_reference_distances:
-                for ref, dist_from_right in self.entity_reference_distances[right].items():
-                    inherited_dist = dist_to_left + 1 + dist_from_right
-
-                    if ref not in self.entity_reference_distances[dependent]:
-                        self.entity_reference_distances[dependent][ref] = inherited_dist
-                        log(f"  [PROPAGATE] dist({dependent}, {ref}) = {inherited_dist}")
-                    elif self.entity_reference_distances[dependent][ref] < inherited_dist:
-                        old = self.entity_reference_distances[dependent][ref]
-                        self.entity_reference_distances[dependent][ref] = inherited_dist
-                        log(f"  [PROPAGATE] dist({dependent}, {ref}) = {old} -> {inherited_dist}")
+            # Only strictly longer paths are written; every other ref is
+            # left untouched
+            if right_row is not None:
+                for ref, dist_from_right in right_row.items():
+                    inherited_dist = new_dist_to_right + dist_from_right
+
+                    old = dependent_row.get(ref, 0)
+                    if old < inherited_dist:
+                        dependent_row[ref] = inherited_dist
+                        if debug:
+                            if old:
+                                log(f"  [PROPAGATE] dist({dependent}, {ref}) = {old} -> {inherited_dist}")
+                            else:
+                                log(f"  [PROPAGATE] dist({dependent}, {ref}) = {inherited_dist}")
 
     def remove_relation(self, left, right):
         """
@@ -241,11 +274,19 @@ class LayerClassifier:
         Complexity: O(a×r) where a = affected entities
         Still better than O(n×r) for full recalculation
         """
-        log(f"\n[REMOVE] {left} -> {right}")
+        if debug:
+            log(f"\n[REMOVE] {left} -> {right}")
 
         # 1. Remove from structures
-        if (left, right) in self.relations:
+        # Membership is answered by relation_counts, so the list is scanned
+        # once (by remove) instead of twice, and not at all when absent
+        count = self.relation_counts.get((left, right), 0)
+        if count:
             self.relations.remove((left, right))
+            if count == 1:
+                del self.relation_counts[(left, right)]
+            else:
+                self.relation_counts[(left, right)] = count - 1
 
         if (left, right) in self.distances:
             del self.distances[(left, right)]
@@ -261,7 +302,8 @@ class LayerClassifier:
         # 4. Find affected entities (those that have distances through left -> right)
         affected = self._find_affected_by_removal(left, right)
 
-        log(f"  [AFFECTED] {len(affected)} entities need recalculation")
+        if debug:
+            log(f"  [AFFECTED] {len(affected)} entities need recalculation")
 
         # 5. Clear distances for affected entities
         for entity in affected:
@@ -276,7 +318,8 @@ class LayerClassifier:
         # Mark layers as dirty
         self.cached_layers = None
 
-        log(f"[REMOVE] Complete")
+        if debug:
+            log(f"[REMOVE] Complete")
 
     def _find_affected_by_removal(self, left, right):
         """
@@ -292,19 +335,14 @@ class LayerClassifier:
         affected.add(left)
 
         # All dependents of 'left' are potentially affected
-        def find_all_dependents(entity, visited=None):
-            if visited is None:
-                visited = set()
-            if entity in visited:
-                return visited
-            visited.add(entity)
-
-            for dependent in self.dependents_index.get(entity, set()):
-                find_all_dependents(dependent, visited)
-
-            return visited
-
-        affected.update(find_all_dependents(left))
+        # Iterative sweep (no recursion frames, no RecursionError on deep schemas)
+        queue = deque([left])
+        while queue:
+            entity = queue.popleft()
+            for dependent in self.dependents_index.get(entity, ()):
+                if dependent not in affected:
+                    affected.add(dependent)
+                    queue.append(dependent)
 
         return affected
 
@@ -314,93 +352,132 @@ class LayerClassifier:
 
         Use same logic as _update_distances_step_by_step but only for affected
         """
+        distances = self.entity_reference_distances
+
         # For each affected entity, recalculate its distances
         for entity in affected:
             # Recalculate distances from scratch for this entity
             for left, right in self.relations:
                 if left == entity:
                     # Direct relation
-                    if entity not in self.entity_reference_distances:
-                        self.entity_reference_distances[entity] = {}
-                    self.entity_reference_distances[entity][right] = 1
+                    entity_row = distances.get(entity)
+                    if entity_row is None:
+                        entity_row = distances[entity] = {}
+                    entity_row[right] = 1
 
                     # Inherit transitives
-                    if right in self.entity_reference_distances:
-                        for ref, dist in self.entity_reference_distances[right].items():
+                    right_row = distances.get(right)
+                    if right_row is not None:
+                        for ref, dist in right_row.items():
                             inherited = 1 + dist
-                            if ref not in self.entity_reference_distances[entity]:
-                                self.entity_reference_distances[entity][ref] = inherited
-                            else:
-                                self.entity_reference_distances[entity][ref] = max(
-                                    self.entity_reference_distances[entity][ref],
-                                    inherited
-                                )
+                            if entity_row.get(ref, 0) < inherited:
+                                entity_row[ref] = inherited
 
     def _precompute_clusters(self):
         """Pre-compute clusters cache"""
-        self.clusters_cache = defaultdict(set)
+        clusters = {}
         for left, right in self.relations:
-            self.clusters_cache[right].add(left)
-
-    def _propagate_distance_update(self, updated_entity, updated_ref, new_dist, visited=None):
-        """Propagate distance update (from algo10)"""
-        if visited is None:
-            visited = set()
+            cluster = clusters.get(right)
+            if cluster is None:
+                clusters[right] = {left}
+            else:
+                cluster.add(left)
+        self.clusters_cache = clusters
+
+    def _propagate_distance_update(self, updated_entity, updated_ref, new_dist):
+        """
+        Propagate distance update (from algo10)
 
-        propagation_key = (updated_entity, updated_ref, new_dist)
-        if propagation_key in visited:
-            return
-        visited.add(propagation_key)
+        Explicit stack instead of recursion (same depth-first order, no Python
+        frame per update and no recursion limit). Without cycles a distance
+        never exceeds the number of entities; larger values only come from
+        going round a cycle, which used to recurse until RecursionError. They
+        are no longer propagated.
+        """
+        distances = self.entity_reference_distances
+        max_dist = len(self.entities)
+        visited = set()
+        # Stack frames: (updated_entity, updated_ref, new_dist, remaining dependents)
+        stack = []
+
+        def push(entity, ref, dist):
+            propagation_key = (entity, ref, dist)
+            if propagation_key not in visited:
+                visited.add(propagation_key)
+                stack.append((entity, ref, dist, iter(self.dependents_index.get(entity, ()))))
+
+        push(updated_entity, updated_ref, new_dist)
+
+        while stack:
+            updated_entity, updated_ref, new_dist, dependents = stack[-1]
+
+            for entity in dependents:
+                entity_row = distances.get(entity)
+                if entity_row is None:
+                    continue
+                dist_to_updated = entity_row.get(updated_entity)
+                if dist_to_updated is None:
+                    continue
 
-        for entity in self.dependents_index[updated_entity]:
-            if updated_entity in self.entity_reference_distances[entity]:
-                dist_to_updated = self.entity_reference_distances[entity][updated_entity]
                 inherited_dist = dist_to_updated + new_dist
+                if inherited_dist > max_dist:
+                    continue  # Going round a cycle
 
-                if updated_ref not in self.entity_reference_distances[entity]:
-                    self.entity_reference_distances[entity][updated_ref] = inherited_dist
-                    self._propagate_distance_update(entity, updated_ref, inherited_dist, visited)
-                elif self.entity_reference_distances[entity][updated_ref] < inherited_dist:
-                    self.entity_reference_distances[entity][updated_ref] = inherited_dist
-                    self._propagate_distance_update(entity, updated_ref, inherited_dist, visited)
+                if entity_row.get(updated_ref, 0) < inherited_dist:
+                    entity_row[updated_ref] = inherited_dist
+                    # Propagate this update before the remaining dependents
+                    push(entity, updated_ref, inherited_dist)
+                    break
+            else:
+                stack.pop()
 
     def _update_distances_step_by_step(self, entity_order):
         """Full distance calculation (from algo10)"""
         self._precompute_clusters()
+        distances = self.entity_reference_distances
 
         for reference_entity in entity_order:
             if reference_entity not in self.entities:
                 continue
 
-            cluster_elements = self.clusters_cache.get(reference_entity, set())
+            cluster_elements = self.clusters_cache.get(reference_entity, ())
             if not cluster_elements:
                 continue
 
+            # Build dependents index (the set is fetched once per reference)
+            reference_dependents = self.dependents_index.get(reference_entity)
+            if reference_dependents is None:
+                reference_dependents = self.dependents_index[reference_entity] = set()
+
             for element in cluster_elements:
                 # Direct distance = 1
-                if element not in self.entity_reference_distances:
-                    self.entity_reference_distances[element] = {}
-                self.entity_reference_distances[element][reference_entity] = 1
+                element_row = distances.get(element)
+                if element_row is None:
+                    element_row = distances[element] = {}
+                element_row[reference_entity] = 1
 
-                # Build dependents index
-                self.dependents_index[reference_entity].add(element)
+                reference_dependents.add(element)
 
                 # Inherit transitive distances
-                if reference_entity in self.entity_reference_distances:
-                    for prev_ref, prev_dist in self.entity_reference_distances[reference_entity].items():
+                # The reference row is re-read per element: a self-referencing
+                # element creates it while this cluster is being processed
+                reference_row = distances.get(reference_entity)
+                if reference_row is not None:
+                    for prev_ref, prev_dist in reference_row.items():
                         inherited_dist = 1 + prev_dist
 
-                        if prev_ref not in self.entity_reference_distances[element]:
-                            self.entity_reference_distances[element][prev_ref] = inherited_dist
-                        elif self.entity_reference_distances[element][prev_ref] < inherited_dist:
-                            self.entity_reference_distances[element][prev_ref] = inherited_dist
+                        old_dist = element_row.get(prev_ref)
+                        if old_dist is None:
+                            element_row[prev_ref] = inherited_dist
+                        elif old_dist < inherited_dist:
+                            element_row[prev_ref] = inherited_dist
                             self._propagate_distance_update(element, prev_ref, inherited_dist)
 
         # Update global distances
-        for entity, ref_dists in self.entity_reference_distances.items():
+        for entity, ref_dists in distances.items():
             for ref, dist in ref_dists.items():
                 key = (entity, ref)
-                if key not in self.distances or self.distances[key] < dist:
+                if self.distances.get(key, 0) < dist:
                     self.distances[key] = dist
 
     def _count_connections(self):
@@ -416,27 +493,33 @@ class LayerClassifier:
         Compute layers with caching support
 
         If structure hasn't changed, return cached result
+        (an empty layout is a valid cached result too)
         """
-        if not self.is_structure_dirty and self.cached_layers:
+        if not self.is_structure_dirty and self.cached_layers is not None:
             return self.cached_layers
 
         # Full calculation
         self._update_distances_step_by_step(entity_order)
 
         if len(self.entities) == 0:
+            self.cached_layers = []
+            self.is_structure_dirty = False
             return []
 
         connections = self._count_connections()
 
+        # Neighbors of each entity, built in one pass over the relations
+        # instead of rescanning them for every candidate reference
+        neighbors = defaultdict(list)
+        for left, right in self.relations:
+            neighbors[left].append(right)
+            if right != left:
+                neighbors[right].append(left)
+
         # Find reference entity (most connected)
         def get_reference_score(entity):
             direct = connections.get(entity, 0)
-            neighbors_sum = sum(
-                connections.get(neighbor, 0)
-                for left, right in self.relations
-                if left == entity or right == entity
-                for neighbor in ([right] if left == entity else [left])
-            )
+            neighbors_sum = sum(connections[neighbor] for neighbor in neighbors[entity])
             return (direct, neighbors_sum)
 
         reference_entity = max(self.entities, key=get_reference_score)
@@ -444,11 +527,17 @@ class LayerClassifier:
         # Place entities in layers
         layers_map = {reference_entity: 0}
 
-        sorted_distances = sorted(
-            self.distances.items(),
-            key=lambda x: connections.get(x[0][0], 0) + connections.get(x[0][1], 0),
-            reverse=True
-        )
+        # Weight of each relation computed once, then sorted through the
+        # C-level dict __getitem__ instead of a Python lambda per comparison.
+        # Relations are kept as flat (left, right, distance) triples
+        relation_weight = {
+            pair: connections.get(pair[0], 0) + connections.get(pair[1], 0)
+            for pair in self.distances
+        }
+        sorted_distances = [
+            (left, right, self.distances[(left, right)])
+            for left, right in sorted(relation_weight, key=relation_weight.__getitem__, reverse=True)
+        ]
 
         max_iterations = len(self.entities) ** 2
         iteration = 0
@@ -457,7 +546,7 @@ class LayerClassifier:
             iteration += 1
             progress = False
 
-            for (left, right), distance in sorted_distances:
+            for left, right, distance in sorted_distances:
                 if left in layers_map and right not in layers_map:
                     layers_map[right] = layers_map[left] + distance
                     progress = True
@@ -471,10 +560,11 @@ class LayerClassifier:
                         progress = True
 
             if not progress:
-                for entity in self.entities:
-                    if entity not in layers_map:
-                        layers_map[entity] = 0
-                        progress = True
+                # Unreached entities go to layer 0 in one update, which
+                # completes layers_map and ends the propagation
+                layers_map.update(dict.fromkeys(
+                    [entity for entity in self.entities if entity not in layers_map], 0))
+                break
 
         # Normalize
         min_layer = min(layers_map.values())
@@ -497,28 +587,78 @@ class LayerClassifier:
         return sorted_layers
 
 # Helper functions from algo10
+_OPERATORS = ('<>', '->', '>', '<', '-')
+
 def extract_table_name(s):
-    return s.split('.')[0].strip()
+    return s.partition('.')[0].strip()
+
+def parse_relations(relations_input):
+    """Parse (left, right) relations from the DSL, deduplicated regardless of direction"""
+    relations = []
+    seen_pairs = set()
+    for line in relations_input.strip().split('\n'):
+        line = line.strip()
+        if not line or line.startswith('//'):
+            continue
+
+        # Operator chosen by priority, not position; the right side stops at
+        # the next occurrence of the same operator
+        for operator in _OPERATORS:
+            index = line.find(operator)
+            if index != -1:
+                break
+        else:
+            continue
+        a = extract_table_name(line[:index])
+        b = extract_table_name(line[index + len(operator):].partition(operator)[0])
+        if operator == '<':
+            a, b = b, a  # Reverse
+
+        pair_key = (a, b) if a <= b else (b, a)
+        if pair_key not in seen_pairs:
+            seen_pairs.add(pair_key)
+            relations.append((a, b))
+
+    return tuple(relations)
+
+# CRM dataset parsed once at import time
+CRM_RELATIONS = parse_relations(relations_input_crm)
 
 def reorder_layers_by_cluster(layers, relations, entity_order):
     """Vertical reorganization (from algo10)"""
     if not layers:
         return layers
 
+    # Indexes built once: position of each entity in entity_order (first
+    # occurrence, as list.index) and outgoing targets of each entity in
+    # relation order
+    order_pos = {}
+    for i, e in enumerate(entity_order):
+        order_pos.setdefault(e, i)
+    forward_adj = defaultdict(list)
+    for left, right in relations:
+        forward_adj[left].append(right)
+
     # Last layer: order by entity_order
     last_layer = layers[-1]
-    ordered_last = [e for e in entity_order if e in last_layer]
-    ordered_last.extend([e for e in last_layer if e not in ordered_last])
+    last_layer_set = set(last_layer)
+    ordered_last = [e for e in entity_order if e in last_layer_set]
+    placed = set(ordered_last)
+    ordered_last.extend([e for e in last_layer if e not in placed])
     layers[-1] = ordered_last
 
     # Other layers: group by target
     for layer_idx in range(len(layers) - 2, -1, -1):
         current_layer = layers[layer_idx]
         next_layer = layers[layer_idx + 1]
+        # Position in next_layer (replaces next_layer.index and `in next_layer`)
+        next_pos = {}
+        for i, e in enumerate(next_layer):
+            next_pos.setdefault(e, i)
 
         entity_targets = {}
         for entity in current_layer:
-            targets = [right for left, right in relations if left == entity and right in next_layer]
+            targets = [right for right in forward_adj.get(entity, ()) if right in next_pos]
             entity_targets[entity] = targets[0] if targets else None
 
         target_groups = defaultdict(list)
@@ -526,11 +666,11 @@ def reorder_layers_by_cluster(layers, relations, entity_order):
             target_groups[entity_targets[entity]].append(entity)
 
         for target in target_groups:
-            target_groups[target].sort(key=lambda e: entity_order.index(e) if e in entity_order else float('inf'))
+            target_groups[target].sort(key=lambda e: order_pos.get(e, float('inf')))
 
         ordered_targets = sorted(
             target_groups.keys(),
-            key=lambda t: next_layer.index(t) if t and t in next_layer else -1
+            key=lambda t: next_pos[t] if t else -1
         )
 
         ordered_layer = []
@@ -14,11 +14,15 @@ Vocabulary:
 - Pivot: Entity belonging to multiple predecessor groups
 """
 
+import heapq
 from collections import defaultdict
 from typing import List, Tuple, Set, Dict
 
 # === PHASE 0: RELATION PARSER ===
 
+_OPERATORS = ('<>', '->', '>', '<', '-')
+
+
 class RelationParser:
     """
     Parses DSL relations into normalized (left, right) tuples
@@ -28,7 +32,7 @@ class RelationParser:
     @staticmethod
     def extract_entity_name(s: str) -> str:
         """Extract entity name from 'entity.field' or 'entity'"""
-        return s.split('.')[0].strip()
+        return s.partition('.')[0].strip()
 
     @classmethod
     def parse(cls, dsl_input: str) -> List[Tuple[str, str]]:
@@ -44,32 +48,18 @@ class RelationParser:
             if not line or line.startswith('//'):
                 continue
 
-            # Detect relation type and parse
-            if '<>' in line:
-                parts = line.split('<>')
-                a = cls.extract_entity_name(parts[0])
-                b = cls.extract_entity_name(parts[1])
-                relations_raw.append((a, b))
-            elif '->' in line:
-                parts = line.split('->')
-                a = cls.extract_entity_name(parts[0])
-                b = cls.extract_entity_name(parts[1])
-                relations_raw.append((a, b))
-            elif '>' in line:
-                parts = line.split('>')
-                a = cls.extract_entity_name(parts[0])
-                b = cls.extract_entity_name(parts[1])
-                relations_raw.append((a, b))
-            elif '<' in line:
-                parts = line.split('<')
-                a = cls.extract_entity_name(parts[0])
-                b = cls.extract_entity_name(parts[1])
-                relations_raw.append((a, b))  # A < B means A is left of B, so A -> B
-            elif '-' in line:
-                parts = line.split('-')
-                a = cls.extract_entity_name(parts[0])
-                b = cls.extract_entity_name(parts[1])
-                relations_raw.append((a, b))
+            # Detect relation type by operator priority, then split at it
+            for operator in _OPERATORS:
+                index = line.find(operator)
+                if index != -1:
+                    break
+            else:
+                continue
+            a = cls.extract_entity_name(line[:index])
+            # The right side stops at the next occurrence of the same operator
+            b = cls.extract_entity_name(line[index + len(operator):].partition(operator)[0])
+            # Whatever the operator (even A < B), the left entity stays left: A -> B
+            relations_raw.append((a, b))
 
         return relations_raw
 
@@ -94,13 +84,13 @@ class GraphPreprocessor:
         Example: users -> profiles AND profiles -> users
                  Only the first one is kept
         """
-        seen_pairs = {}
+        seen_pairs = set()
         unique_relations = []
 
         for a, b in relations:
-            pair_key = frozenset({a, b})  # Order-agnostic
+            pair_key = (a, b) if a <= b else (b, a)  # Order-agnostic, no set allocation
             if pair_key not in seen_pairs:
-                seen_pairs[pair_key] = (a, b)
+                seen_pairs.add(pair_key)
                 unique_relations.append((a, b))
 
         return unique_relations
@@ -131,52 +121,61 @@ class GraphPreprocessor:
         if not connectivity_ranking:
             return []
 
+        # Neighbours and ranking positions, computed once
+        neighbors = defaultdict(list)
+        for a, b in relations:
+            neighbors[a].append(b)
+            neighbors[b].append(a)
+        rank = {entity: idx for idx, entity in enumerate(connectivity_ranking)}
+
         # Build order with breadth-first expansion
         entity_order = []
-        frontier = []  # Entities connected to already processed
+        placed = set()
+        in_frontier = set()  # Entities connected to already processed
+        # Heap of (-connectivity, ranking position, entity): the top is the
+        # max connectivity candidate, ties broken by ranking position
+        frontier = []
+
+        def expand(entity):
+            """Add the unplaced neighbours of entity to the frontier"""
+            for neighbor in neighbors[entity]:
+                if neighbor not in in_frontier and neighbor not in placed:
+                    in_frontier.add(neighbor)
+                    heapq.heappush(frontier, (-connection_count[neighbor], rank[neighbor], neighbor))
 
         # Start with most connected
         entity_order.append(connectivity_ranking[0])
-
-        # Add all neighbors of first entity to frontier
-        for a, b in relations:
-            if a == entity_order[0] and b not in frontier:
-                frontier.append(b)
-            if b == entity_order[0] and a not in frontier:
-                frontier.append(a)
+        placed.add(connectivity_ranking[0])
+        expand(connectivity_ranking[0])
 
         # Expand frontier
         while len(entity_order) < len(connectivity_ranking):
-            candidates = [e for e in frontier if e not in entity_order]
-            if not candidates:
+            # Each entity is pushed once, so every entry is still a candidate
+            if not frontier:
                 break
 
             # Choose next: max connectivity, tie-break by ranking position
-            next_entity = max(
-                candidates,
-                key=lambda e: (
-                    connection_count[e],
-                    -connectivity_ranking.index(e)
-                )
-            )
+            next_entity = heapq.heappop(frontier)[2]
 
             entity_order.append(next_entity)
+            placed.add(next_entity)
 
             # Expand frontier with neighbors
-            for a, b in relations:
-                if a == next_entity and b not in frontier and b not in entity_order:
-                    frontier.append(b)
-                if b == next_entity and a not in frontier and a not in entity_order:
-                    frontier.append(a)
+            expand(next_entity)
 
         return entity_order
 
 # === PHASE 3: HORIZONTAL LAYER CLASSIFIER ===
 
+# Module-wide switch for the diagnostic logs and summaries (off by default)
+DEBUG = False
+
+
 # Helper function for logging (matches algo10)
 def log(message: str, debug=False):
-    """Silently ignore log messages (algo10 compatibility)"""
-    pass
+    """Print log messages only when debugging, silently ignore them otherwise"""
+    if debug or DEBUG:
+        print(message)
 
 class HorizontalLayerClassifier:
     def __init__(self):
@@ -212,42 +211,62 @@ class HorizontalLayerClassifier:
         for left, right in self.relations:
             self.clusters_cache[right].add(left)
 
-    def _propagate_distance_update(self, updated_entity, updated_ref, new_dist, visited=None):
+    def _propagate_distance_update(self, updated_entity, updated_ref, new_dist):
         """
         When an entity's distance to a reference is updated, propagate this change
         to all entities that depend on this entity.
 
         OPTIMIZATION #2: Use dependents_index instead of scanning all entities (O(n) → O(d))
         OPTIMIZATION #5: Early exit with visited set to avoid redundant propagations
+        OPTIMIZATION #6: Explicit stack instead of recursion (same depth-first order,
+        no Python frame per update and no recursion limit)
+
+        Without cycles a distance never exceeds the number of entities; larger
+        values only come from going round a cycle, which used to recurse until
+        RecursionError. They are no longer propagated.
         """
-        # OPTIMIZATION #5: Early exit if we've already processed this update
-        if visited is None:
-            visited = set()
-
-        propagation_key = (updated_entity, updated_ref, new_dist)
-        if propagation_key in visited:
-            return  # Already propagated this exact update
-        visited.add(propagation_key)
-
-        # OPTIMIZATION #2: Only iterate over entities that actually depend on updated_entity
-        # Instead of: for entity in self.entity_reference_distances:
-        for entity in self.dependents_index[updated_entity]:
-            if updated_entity in self.entity_reference_distances[entity]:
-                dist_to_updated = self.entity_reference_distances[entity][updated_entity]
-                inherited_dist = dist_to_updated + new_dist
-
-                # Update if no distance exists or if new path is longer (more intercalations)
-                if updated_ref not in self.entity_reference_distances[entity]:
-                    self.entity_reference_distances[entity][updated_ref] = inherited_dist
-                    log( f"[PROPAGATION] dist({entity}, {updated_ref}) = {inherited_dist} (via {updated_entity})")
-                    # Recursively propagate this update
-                    self._propagate_distance_update(entity, updated_ref, inherited_dist, visited)
-                elif self.entity_reference_distances[entity][updated_ref] < inherited_dist:
-                    old_dist = self.entity_reference_distances[entity][updated_ref]
-                    self.entity_reference_distances[entity][updated_ref] = inherited_dist
-                    log(f"  [PROPAGATION] dist({entity}, {updated_ref}) = {old_dist} -> {inherited_dist} (via {updated_entity})")
-                    # Recursively propagate this update
-                    self._propagate_distance_update(entity, updated_ref, inherited_dist, visited)
+        max_dist = len(self.entities)
+        visited = set()
+        # Stack frames: (updated_entity, updated_ref, new_dist, remaining dependents)
+        stack = []
+
+        def push(entity, ref, dist):
+            # OPTIMIZATION #5: Early exit if we've already processed this update
+            propagation_key = (entity, ref, dist)
+            if propagation_key not in visited:
+                visited.add(propagation_key)
+                stack.append((entity, ref, dist, iter(self.dependents_index[entity])))
+
+        push(updated_entity, updated_ref, new_dist)
+
+        while stack:
+            updated_entity, updated_ref, new_dist, dependents = stack[-1]
+
+            # OPTIMIZATION #2: Only iterate over entities that actually depend on updated_entity
+            # Instead of: for entity in self.entity_reference_distances:
+            for entity in dependents:
+                if updated_entity in self.entity_reference_distances[entity]:
+                    dist_to_updated = self.entity_reference_distances[entity][updated_entity]
+                    inherited_dist = dist_to_updated + new_dist
+                    if inherited_dist > max_dist:
+                        continue  # Going round a cycle
+
+                    # Update if no distance exists or if new path is longer (more intercalations)
+                    if updated_ref not in self.entity_reference_distances[entity]:
+                        self.entity_reference_distances[entity][updated_ref] = inherited_dist
+                        log( f"[PROPAGATION] dist({entity}, {updated_ref}) = {inherited_dist} (via {updated_entity})")
+                        # Propagate this update before the remaining dependents
+                        push(entity, updated_ref, inherited_dist)
+                        break
+                    elif self.entity_reference_distances[entity][updated_ref] < inherited_dist:
+                        old_dist = self.entity_reference_distances[entity][updated_ref]
+                        self.entity_reference_distances[entity][updated_ref] = inherited_dist
+                        log(f"  [PROPAGATION] dist({entity}, {updated_ref}) = {old_dist} -> {inherited_dist} (via {updated_entity})")
+                        # Propagate this update before the remaining dependents
+                        push(entity, updated_ref, inherited_dist)
+                        break
+            else:
+                stack.pop()
 
     def _update_distances_step_by_step(self, entity_order):
         """
@@ -386,15 +405,20 @@ class HorizontalLayerClassifier:
         log(f"Entite de reference: {reference_entity} ({connections[reference_entity]} connexions, somme voisins: {ref_score[1]})")
 
         # Étape 2: Trier les relations par connectivité
-        sorted_distances = sorted(
-            self.distances.items(),
-            key=lambda item: connections[item[0][0]] + connections[item[0][1]],
-            reverse=True
-        )
+        # OPTIMIZATION #7: Weight of each relation computed once, then sorted
+        # through the C-level dict __getitem__ and reused by the log below
+        relation_weight = {
+            pair: connections[pair[0]] + connections[pair[1]]
+            for pair in self.distances
+        }
+        sorted_distances = [
+            (pair, self.distances[pair])
+            for pair in sorted(relation_weight, key=relation_weight.__getitem__, reverse=True)
+        ]
 
         log(f"=== Relations triees par connectivite ===")
         for idx, ((left, right), distance) in enumerate(sorted_distances[:15], 1):
-            conn_sum = connections[left] + connections[right]
+            conn_sum = relation_weight[(left, right)]
             log(f"{idx}. {left}({connections[left]}) r {right}({connections[right]}) = {conn_sum} connexions")
 
         # Étape 3: Placer l'entité de référence au layer 0
@@ -429,23 +453,26 @@ class HorizontalLayerClassifier:
                         layers[entity] = 0
 
         # Afficher résumé
-        log(f"========================================")
-        log(f"DISTANCES PAR RAPPORT A {reference_entity.upper()}")
-        log(f"========================================")
-
-        by_distance = {}
-        for entity in layers.keys():
-            if entity != reference_entity:
-                dist = layers[entity]
-                if dist not in by_distance:
-                    by_distance[dist] = []
-                by_distance[dist].append(entity)
-
-        for dist in sorted(by_distance.keys()):
-            direction = "GAUCHE" if dist < 0 else ("DROITE" if dist > 0 else "MEME LAYER")
-            log(f"Distance {dist:+d} ({direction}):")
-            for entity in sorted(by_distance[dist]):
-                log(f"- {entity}")
+        # The by-distance grouping only feeds the log: skip building it
+        # unless debugging
+        if DEBUG:
+            log(f"========================================")
+            log(f"DISTANCES PAR RAPPORT A {reference_entity.upper()}")
+            log(f"========================================")
+
+            by_distance = {}
+            for entity in layers.keys():
+                if entity != reference_entity:
+                    dist = layers[entity]
+                    if dist not in by_distance:
+                        by_distance[dist] = []
+                    by_distance[dist].append(entity)
+
+            for dist in sorted(by_distance.keys()):
+                direction = "GAUCHE" if dist < 0 else ("DROITE" if dist > 0 else "MEME LAYER")
+                log(f"Distance {dist:+d} ({direction}):")
+                for entity in sorted(by_distance[dist]):
+                    log(f"- {entity}")
 
         # Normaliser
         if layers:
@@ -515,6 +542,11 @@ class VerticalOrderOptimizer:
     def __init__(self, relations: List[Tuple[str, str]]):
         self.relations = relations
 
+        # Outgoing relations per entity (relation order kept), built once
+        self.targets_of = defaultdict(list)
+        for left, right in relations:
+            self.targets_of[left].append(right)
+
     def optimize(
         self,
         layers: List[List[str]],
@@ -560,8 +592,11 @@ class VerticalOrderOptimizer:
         entity_order: List[str]
     ) -> List[str]:
         """Sort layer by entity_order"""
-        ordered = [e for e in entity_order if e in layer]
-        ordered.extend([e for e in layer if e not in ordered])
+        # Set membership instead of scanning the layer / ordered lists
+        layer_members = set(layer)
+        ordered = [e for e in entity_order if e in layer_members]
+        placed = set(ordered)
+        ordered.extend([e for e in layer if e not in placed])
         return ordered
 
     def _sort_layer_by_targets(
@@ -575,12 +610,21 @@ class VerticalOrderOptimizer:
 
         Handles pivots: entities targeting multiple entities in next layer
         """
+        # Positions in next_layer / entity_order (first occurrence, like list.index),
+        # also used for next_layer occupancy lookups
+        next_pos = {}
+        for idx, entity in enumerate(next_layer):
+            next_pos.setdefault(entity, idx)
+        order_pos = {}
+        for idx, entity in enumerate(entity_order):
+            order_pos.setdefault(entity, idx)
+
         # Find targets for each entity
         entity_to_targets = {}
         for entity in current_layer:
             targets = [
-                right for left, right in self.relations
-                if left == entity and right in next_layer
+                right for right in self.targets_of[entity]
+                if right in next_pos
             ]
             entity_to_targets[entity] = targets
 
@@ -589,7 +633,7 @@ class VerticalOrderOptimizer:
         for entity, targets in entity_to_targets.items():
             if targets:
                 # Primary = first target in next_layer order
-                primary = min(targets, key=lambda t: next_layer.index(t))
+                primary = min(targets, key=next_pos.__getitem__)
                 entity_to_primary_target[entity] = primary
             else:
                 entity_to_primary_target[entity] = None
@@ -603,13 +647,13 @@ class VerticalOrderOptimizer:
         # Sort each group by entity_order
         for target in target_groups:
             target_groups[target].sort(
-                key=lambda e: entity_order.index(e) if e in entity_order else float('inf')
+                key=lambda e: order_pos.get(e, float('inf'))
             )
 
         # Order groups by target position in next_layer
         ordered_targets = sorted(
             target_groups.keys(),
-            key=lambda t: next_layer.index(t) if t and t in next_layer else -1
+            key=lambda t: next_pos.get(t, -1) if t else -1
         )
 
         # Build final order
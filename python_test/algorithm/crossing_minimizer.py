@@ -10,7 +10,7 @@ This is applied iteratively in both directions (left-to-right and right-to-left)
 to minimize crossings across all layer pairs.
 """
 
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Set
 
 
 class CrossingMinimizer:
@@ -27,18 +27,36 @@ class CrossingMinimizer:
         """
         self.relations = relations
 
-        # Build adjacency maps for fast lookup
-        self.forward_edges = {}  # entity -> set of targets
-        self.backward_edges = {}  # entity -> set of sources
+        # Entity names are interned to dense integer ids; all internal
+        # structures are keyed by id and names are restored on output
+        self.entity_ids: Dict[str, int] = {}  # name -> id
+        self.entity_names: List[str] = []  # id -> name
 
-        for left, right in relations:
-            if left not in self.forward_edges:
-                self.forward_edges[left] = set()
-            self.forward_edges[left].add(right)
+        # Build adjacency maps for fast lookup, indexed by entity id
+        self.forward_edges: List[Set[int]] = []  # id -> set of target ids
+        self.backward_edges: List[Set[int]] = []  # id -> set of source ids
 
-            if right not in self.backward_edges:
-                self.backward_edges[right] = set()
-            self.backward_edges[right].add(left)
+        for left, right in relations:
+            left_id = self._intern(left)
+            right_id = self._intern(right)
+            self.forward_edges[left_id].add(right_id)
+            self.backward_edges[right_id].add(left_id)
+
+        # Barycenters only depend on the reference layer order, so they are
+        # memoized per (direction, reference layer) and reused by any sweep
+        # that meets the same neighbouring order again
+        self.barycenter_cache: Dict[Tuple[str, Tuple[int, ...]], Dict[int, float]] = {}
+
+    def _intern(self, entity: str) -> int:
+        """Return the integer id of entity, allocating one on first sight"""
+        entity_id = self.entity_ids.get(entity)
+        if entity_id is None:
+            entity_id = len(self.entity_names)
+            self.entity_ids[entity] = entity_id
+            self.entity_names.append(entity)
+            self.forward_edges.append(set())
+            self.backward_edges.append(set())
+        return entity_id
 
     def minimize_crossings(
         self,
@@ -62,8 +80,10 @@ class CrossingMinimizer:
         if len(layers) <= 1:
             return layers
 
-        # Deep copy
-        current_layers = [layer[:] for layer in layers]
+        self.barycenter_cache.clear()
+
+        # Deep copy as integer ids
+        current_layers = [[self._intern(e) for e in layer] for layer in layers]
 
         # Count initial crossings
         initial_crossings = self._count_total_crossings(current_layers)
@@ -75,6 +95,7 @@ class CrossingMinimizer:
         # Iterative improvement
         for iteration in range(max_iterations):
             print(f"\n--- Iteration {iteration + 1} ---")
+            changed = False
 
             # Forward pass (left to right)
             for layer_idx in range(1, len(current_layers)):
@@ -86,7 +107,9 @@ class CrossingMinimizer:
                     current_layer,
                     prev_layer
                 )
-                current_layers[layer_idx] = reordered
+                if reordered != current_layer:
+                    current_layers[layer_idx] = reordered
+                    changed = True
 
             # Backward pass (right to left)
             for layer_idx in range(len(current_layers) - 2, -1, -1):
@@ -98,7 +121,9 @@ class CrossingMinimizer:
                     current_layer,
                     next_layer
                 )
-                current_layers[layer_idx] = reordered
+                if reordered != current_layer:
+                    current_layers[layer_idx] = reordered
+                    changed = True
 
             # Count crossings after this iteration
             crossings = self._count_total_crossings(current_layers)
@@ -115,101 +140,134 @@ class CrossingMinimizer:
                 print("\n[SUCCESS] Zero crossings achieved!")
                 break
 
+            # Early exit once a full sweep leaves every layer unchanged:
+            # later sweeps would reproduce the same orders
+            if not changed:
+                print("\n[CONVERGED] Layer orders stable")
+                break
+
         print(f"\n" + "="*80)
         print(f"CROSSING MINIMIZATION COMPLETE")
         print(f"Final crossings: {best_crossings} (reduced from {initial_crossings})")
         print("="*80)
 
-        return best_layers
+        names = self.entity_names
+        return [[names[i] for i in layer] for layer in best_layers]
 
     def _reorder_by_barycenter_backward(
         self,
-        current_layer: List[str],
-        prev_layer: List[str]
-    ) -> List[str]:
+        current_layer: List[int],
+        prev_layer: List[int]
+    ) -> List[int]:
         """
         Reorder current layer based on barycenter of connections from prev_layer
 
         Barycenter = average position of source entities in prev_layer
         """
-        barycenters = {}
-
-        for entity in current_layer:
-            # Find sources in prev_layer
-            sources = []
-            if entity in self.backward_edges:
-                for source in self.backward_edges[entity]:
-                    if source in prev_layer:
-                        sources.append(source)
-
-            if sources:
-                # Calculate barycenter (average position in prev_layer)
-                positions = [prev_layer.index(s) for s in sources]
-                barycenter = sum(positions) / len(positions)
-            else:
-                # No connections: place at end
-                barycenter = float('inf')
+        barycenters = self._layer_barycenters(
+            current_layer, prev_layer, 'backward', self.backward_edges
+        )
 
-            barycenters[entity] = barycenter
+        # (barycenter, current position, entity) tuples: sorted natively,
+        # current position breaks ties so entities are never compared
+        keyed = [
+            (barycenters[entity], current_idx, entity)
+            for current_idx, entity in enumerate(current_layer)
+        ]
 
         # Sort by barycenter
-        reordered = sorted(current_layer, key=lambda e: (barycenters[e], current_layer.index(e)))
+        keyed.sort()
+        reordered = [entity for _, _, entity in keyed]
 
         return reordered
 
     def _reorder_by_barycenter_forward(
         self,
-        current_layer: List[str],
-        next_layer: List[str]
-    ) -> List[str]:
+        current_layer: List[int],
+        next_layer: List[int]
+    ) -> List[int]:
         """
         Reorder current layer based on barycenter of connections to next_layer
 
         Barycenter = average position of target entities in next_layer
         """
-        barycenters = {}
-
-        for entity in current_layer:
-            # Find targets in next_layer
-            targets = []
-            if entity in self.forward_edges:
-                for target in self.forward_edges[entity]:
-                    if target in next_layer:
-                        targets.append(target)
-
-            if targets:
-                # Calculate barycenter (average position in next_layer)
-                positions = [next_layer.index(t) for t in targets]
-                barycenter = sum(positions) / len(positions)
-            else:
-                # No connections: place at end
-                barycenter = float('inf')
+        barycenters = self._layer_barycenters(
+            current_layer, next_layer, 'forward', self.forward_edges
+        )
 
-            barycenters[entity] = barycenter
+        # (barycenter, current position, entity) tuples: sorted natively,
+        # current position breaks ties so entities are never compared
+        keyed = [
+            (barycenters[entity], current_idx, entity)
+            for current_idx, entity in enumerate(current_layer)
+        ]
 
         # Sort by barycenter
-        reordered = sorted(current_layer, key=lambda e: (barycenters[e], current_layer.index(e)))
+        keyed.sort()
+        reordered = [entity for _, _, entity in keyed]
 
         return reordered
 
+    def _layer_barycenters(
+        self,
+        current_layer: List[int],
+        reference_layer: List[int],
+        direction: str,
+        edges: List[Set[int]]
+    ) -> Dict[int, float]:
+        """
+        Barycenter of each entity of current_layer against reference_layer
+
+        Barycenter = average position of the neighbours (via edges) found in
+        reference_layer, or infinity when there are none (placed at end).
+        Results are memoized for the exact reference layer order.
+        """
+        cache_key = (direction, tuple(reference_layer))
+        barycenters = self.barycenter_cache.get(cache_key)
+        if barycenters is None:
+            barycenters = self.barycenter_cache[cache_key] = {}
+
+        reference_pos = None
+        for entity in current_layer:
+            if entity in barycenters:
+                continue
+
+            # Position lookups built once per layer instead of list.index scans
+            if reference_pos is None:
+                reference_pos = {e: i for i, e in enumerate(reference_layer)}
+
+            positions = []
+            for neighbour in edges[entity]:
+                position = reference_pos.get(neighbour)
+                if position is not None:
+                    positions.append(position)
+
+            if positions:
+                barycenters[entity] = sum(positions) / len(positions)
+            else:
+                barycenters[entity] = float('inf')
+
+        return barycenters
+
     def _count_crossings_between_layers(
         self,
-        left_layer: List[str],
-        right_layer: List[str]
+        left_layer: List[int],
+        right_layer: List[int]
     ) -> int:
         """
         Count edge crossings between two adjacent layers
         """
         crossings = 0
 
+        right_pos = {e: i for i, e in enumerate(right_layer)}
+
         # Get all edges between these layers
         edges = []
         for left_idx, left_entity in enumerate(left_layer):
-            if left_entity in self.forward_edges:
-                for right_entity in self.forward_edges[left_entity]:
-                    if right_entity in right_layer:
-                        right_idx = right_layer.index(right_entity)
-                        edges.append((left_idx, right_idx))
+            for right_entity in self.forward_edges[left_entity]:
+                right_idx = right_pos.get(right_entity)
+                if right_idx is not None:
+                    edges.append((left_idx, right_idx))
 
         # Count crossings: for each pair of edges, check if they cross
         for i in range(len(edges)):
@@ -223,7 +281,7 @@ class CrossingMinimizer:
 
         return crossings
 
-    def _count_total_crossings(self, layers: List[List[str]]) -> int:
+    def _count_total_crossings(self, layers: List[List[int]]) -> int:
         """Count total crossings across all adjacent layer pairs"""
         total = 0
         for i in range(len(layers) - 1):
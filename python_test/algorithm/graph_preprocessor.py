@@ -27,13 +27,13 @@ class GraphPreprocessor:
         Example: users -> profiles AND profiles -> users
                  Only the first one is kept
         """
-        seen_pairs = {}
+        seen_pairs = set()
         unique_relations = []
 
         for a, b in relations:
-            pair_key = frozenset({a, b})  # Order-agnostic
+            pair_key = (a, b) if a <= b else (b, a)  # Order-agnostic, no set allocation
             if pair_key not in seen_pairs:
-                seen_pairs[pair_key] = (a, b)
+                seen_pairs.add(pair_key)
                 unique_relations.append((a, b))
 
         return unique_relations
@@ -54,53 +54,72 @@ class GraphPreprocessor:
             connection_count[a] += 1
             connection_count[b] += 1
 
-        # Rule 1: Sort by connectivity
+        connection_count = dict(connection_count)
+
+        # Rule 1: Sort by connectivity (degree table built once, read via C-level __getitem__)
         connectivity_ranking = sorted(
-            connection_count.keys(),
-            key=lambda x: connection_count[x],
+            connection_count,
+            key=connection_count.__getitem__,
             reverse=True
         )
 
+        rank = {entity: idx for idx, entity in enumerate(connectivity_ranking)}
+
         # Start with most connected entity
         entity_order = []
-        frontier = []
+        placed = set()    # entities already in entity_order
+        frontier = set()  # entities ever reached by the expansion
+        pending = set()   # frontier entities not placed yet
 
         if connectivity_ranking:
-            entity_order.append(connectivity_ranking[0])
+            first = connectivity_ranking[0]
+            entity_order.append(first)
+            placed.add(first)
 
             # Initialize frontier with neighbors of first entity
             for a, b in relations:
-                if a == entity_order[0] and b not in frontier:
-                    frontier.append(b)
-                if b == entity_order[0] and a not in frontier:
-                    frontier.append(a)
+                if a == first:
+                    frontier.add(b)
+                if b == first:
+                    frontier.add(a)
+            pending = frontier - placed
 
         # Rule 2: Breadth-first expansion with connectivity tie-breaker
         while len(entity_order) < len(connectivity_ranking):
-            candidates = [e for e in frontier if e not in entity_order]
+            # Placed entities are discarded from pending as they go, instead
+            # of re-filtering the whole frontier list on every step
+            candidates = pending
 
             if not candidates:
                 # No more in frontier, pick from unvisited
-                candidates = [e for e in connectivity_ranking if e not in entity_order]
+                candidates = [e for e in connectivity_ranking if e not in placed]
                 if not candidates:
                     break
 
             # Rule 3: Tie-breaker by connectivity ranking
-            next_entity = max(
-                candidates,
-                key=lambda e: (
-                    connection_count[e],
-                    -connectivity_ranking.index(e)
-                )
-            )
+            # Plain loop: no key tuple or ranking.index() scan per candidate
+            next_entity = None
+            best_count = -1
+            for candidate in candidates:
+                count = connection_count[candidate]
+                if count > best_count or (
+                    count == best_count
+                    and rank[candidate] < rank[next_entity]
+                ):
+                    next_entity = candidate
+                    best_count = count
 
             entity_order.append(next_entity)
+            placed.add(next_entity)
+            pending.discard(next_entity)
 
             # Expand frontier with neighbors
             for a, b in relations:
-                if a == next_entity and b not in frontier and b not in entity_order:
-                    frontier.append(b)
-                if b == next_entity and a not in frontier and a not in entity_order:
-                    frontier.append(a)
+                if a == next_entity and b not in frontier and b not in placed:
+                    frontier.add(b)
+                    pending.add(b)
+                if b == next_entity and a not in frontier and a not in placed:
+                    frontier.add(a)
+                    pending.add(a)
 
         return entity_order
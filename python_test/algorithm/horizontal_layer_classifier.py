@@ -9,10 +9,16 @@ from typing import List
 from collections import defaultdict
 
 
+# Module-wide switch for the diagnostic logs and summaries (off by default).
+# Hot loops test it before calling log() so their f-strings are never built
+DEBUG = False
+
+
 # Helper function for logging (algo10 compatibility)
 def log(message: str, debug=False):
-    """Silently ignore log messages"""
-    pass
+    """Print log messages only when debugging, silently ignore them otherwise"""
+    if debug or DEBUG:
+        print(message)
 
 
 class HorizontalLayerClassifier:
@@ -48,46 +54,72 @@ class HorizontalLayerClassifier:
         OPTIMIZATION #1: O(n×r) per step → O(r) once
         Build a cache mapping each entity to its cluster elements.
         """
-        self.clusters_cache = defaultdict(set)
+        clusters = defaultdict(set)
         for left, right in self.relations:
-            self.clusters_cache[right].add(left)
+            clusters[right].add(left)
+        # Plain dict: lookups for entities without a cluster allocate nothing
+        self.clusters_cache = dict(clusters)
 
-    def _propagate_distance_update(self, updated_entity, updated_ref, new_dist, visited=None):
+    def _propagate_distance_update(self, updated_entity, updated_ref, new_dist):
         """
         When an entity's distance to a reference is updated, propagate this change
         to all entities that depend on this entity.
 
         OPTIMIZATION #2: Use dependents_index instead of scanning all entities (O(n) → O(d))
-        OPTIMIZATION #5: Early exit with visited set to avoid redundant propagations
+        OPTIMIZATION #5: Early exit when (entity, ref) was already propagated with
+        a distance at least as large (nothing downstream could grow)
+        OPTIMIZATION #9: Explicit stack instead of recursion (same depth-first order,
+        no Python frame per update and no recursion limit)
+
+        Without cycles a distance never exceeds the number of entities; larger
+        values only come from going round a cycle, which used to recurse until
+        RecursionError. They are no longer propagated.
         """
-        # OPTIMIZATION #5: Early exit if we've already processed this update
-        if visited is None:
-            visited = set()
-
-        propagation_key = (updated_entity, updated_ref, new_dist)
-        if propagation_key in visited:
-            return  # Already propagated this exact update
-        visited.add(propagation_key)
-
-        # OPTIMIZATION #2: Only iterate over entities that actually depend on updated_entity
-        # Instead of: for entity in self.entity_reference_distances:
-        for entity in self.dependents_index[updated_entity]:
-            if updated_entity in self.entity_reference_distances[entity]:
-                dist_to_updated = self.entity_reference_distances[entity][updated_entity]
-                inherited_dist = dist_to_updated + new_dist
-
-                # Update if no distance exists or if new path is longer (more intercalations)
-                if updated_ref not in self.entity_reference_distances[entity]:
-                    self.entity_reference_distances[entity][updated_ref] = inherited_dist
-                    log(f"[PROPAGATION] dist({entity}, {updated_ref}) = {inherited_dist} (via {updated_entity})")
-                    # Recursively propagate this update
-                    self._propagate_distance_update(entity, updated_ref, inherited_dist, visited)
-                elif self.entity_reference_distances[entity][updated_ref] < inherited_dist:
-                    old_dist = self.entity_reference_distances[entity][updated_ref]
-                    self.entity_reference_distances[entity][updated_ref] = inherited_dist
-                    log(f"  [PROPAGATION] dist({entity}, {updated_ref}) = {old_dist} -> {inherited_dist} (via {updated_entity})")
-                    # Recursively propagate this update
-                    self._propagate_distance_update(entity, updated_ref, inherited_dist, visited)
+        max_dist = len(self.entities)
+        propagated = {}  # (entity, ref) -> largest distance already propagated
+        # Stack frames: (updated_entity, updated_ref, new_dist, remaining dependents)
+        stack = []
+
+        def push(entity, ref, dist):
+            # OPTIMIZATION #5: Early exit if this update cannot raise anything
+            propagation_key = (entity, ref)
+            if propagated.get(propagation_key, 0) < dist:
+                propagated[propagation_key] = dist
+                # .get: no empty set is inserted for entities without dependents
+                stack.append((entity, ref, dist, iter(self.dependents_index.get(entity, ()))))
+
+        push(updated_entity, updated_ref, new_dist)
+
+        while stack:
+            updated_entity, updated_ref, new_dist, dependents = stack[-1]
+
+            # OPTIMIZATION #2: Only iterate over entities that actually depend on updated_entity
+            # Instead of: for entity in self.entity_reference_distances:
+            for entity in dependents:
+                if updated_entity in self.entity_reference_distances[entity]:
+                    dist_to_updated = self.entity_reference_distances[entity][updated_entity]
+                    inherited_dist = dist_to_updated + new_dist
+                    if inherited_dist > max_dist:
+                        continue  # Going round a cycle
+
+                    # Update if no distance exists or if new path is longer (more intercalations)
+                    if updated_ref not in self.entity_reference_distances[entity]:
+                        self.entity_reference_distances[entity][updated_ref] = inherited_dist
+                        if DEBUG:
+                            log(f"[PROPAGATION] dist({entity}, {updated_ref}) = {inherited_dist} (via {updated_entity})")
+                        # Propagate this update before the remaining dependents
+                        push(entity, updated_ref, inherited_dist)
+                        break
+                    elif self.entity_reference_distances[entity][updated_ref] < inherited_dist:
+                        old_dist = self.entity_reference_distances[entity][updated_ref]
+                        self.entity_reference_distances[entity][updated_ref] = inherited_dist
+                        if DEBUG:
+                            log(f"  [PROPAGATION] dist({entity}, {updated_ref}) = {old_dist} -> {inherited_dist} (via {updated_entity})")
+                        # Propagate this update before the remaining dependents
+                        push(entity, updated_ref, inherited_dist)
+                        break
+            else:
+                stack.pop()
 
     def _update_distances_step_by_step(self, entity_order):
         """
@@ -97,7 +129,8 @@ class HorizontalLayerClassifier:
 
         This replaces Floyd-Warshall with a more intuitive progressive approach.
         """
-        log("=== STEP-BY-STEP DISTANCE CALCULATION ===")
+        if DEBUG:
+            log("=== STEP-BY-STEP DISTANCE CALCULATION ===")
 
         # OPTIMIZATION #1: Pre-compute clusters once
         self._precompute_clusters()
@@ -107,68 +140,85 @@ class HorizontalLayerClassifier:
             if reference_entity not in self.entities:
                 continue
 
-            log(f"Step {step_idx}: Processing reference '{reference_entity}'")
+            if DEBUG:
+                log(f"Step {step_idx}: Processing reference '{reference_entity}'")
 
             # OPTIMIZATION #1: Use cached clusters instead of scanning relations
-            cluster_elements = self.clusters_cache.get(reference_entity, set())
+            cluster_elements = self.clusters_cache.get(reference_entity)
 
             if not cluster_elements:
-                log(f"No cluster elements for '{reference_entity}'")
+                if DEBUG:
+                    log(f"No cluster elements for '{reference_entity}'")
                 continue
 
-            log(f"Cluster elements: {cluster_elements}")
+            if DEBUG:
+                log(f"Cluster elements: {cluster_elements}")
 
             # For each cluster element, calculate its distance to this reference
             for element in cluster_elements:
                 # Direct distance is always 1
                 direct_dist = 1
 
+                # Row of the element, looked up once instead of per access
+                element_distances = self.entity_reference_distances[element]
+
                 # Store the reference distance
-                self.entity_reference_distances[element][reference_entity] = direct_dist
+                element_distances[reference_entity] = direct_dist
 
                 # OPTIMIZATION #2: Build the dependents index
                 # Track that 'element' depends on 'reference_entity'
                 self.dependents_index[reference_entity].add(element)
 
-                log(f"  dist({element}, {reference_entity}) = {direct_dist}")
+                if DEBUG:
+                    log(f"  dist({element}, {reference_entity}) = {direct_dist}")
 
                 # Calculate transitive distances through this reference
                 # If B -> reference and reference has distance to other refs, then B inherits those distances + 1
                 # IMPORTANT: This must happen BEFORE we display the final distances
-                if reference_entity in self.entity_reference_distances:
-                    for prev_ref, prev_dist in self.entity_reference_distances[reference_entity].items():
+                # (the reference row is re-read per element: propagation may create it)
+                reference_distances = self.entity_reference_distances.get(reference_entity)
+                if reference_distances is not None:
+                    for prev_ref, prev_dist in reference_distances.items():
                         # Inherit distance through reference
                         inherited_dist = direct_dist + prev_dist
 
                         # Only inherit if: (1) no distance exists yet OR (2) inherited path has MORE intercalations (longer)
                         # This finds the path with the maximum number of intercalations
-                        if prev_ref not in self.entity_reference_distances[element]:
-                            self.entity_reference_distances[element][prev_ref] = inherited_dist
-                            log(f"  dist({element}, {prev_ref}) = {inherited_dist} (via {reference_entity})")
-                        elif self.entity_reference_distances[element][prev_ref] < inherited_dist:
+                        old_dist = element_distances.get(prev_ref)
+                        if old_dist is None:
+                            element_distances[prev_ref] = inherited_dist
+                            if DEBUG:
+                                log(f"  dist({element}, {prev_ref}) = {inherited_dist} (via {reference_entity})")
+                        elif old_dist < inherited_dist:
                             # Update to path with more intercalations
-                            old_dist = self.entity_reference_distances[element][prev_ref]
-                            self.entity_reference_distances[element][prev_ref] = inherited_dist
-                            log(f"  dist({element}, {prev_ref}) = {old_dist} -> {inherited_dist} (via {reference_entity}) [MORE INTERCALATIONS]")
+                            element_distances[prev_ref] = inherited_dist
+                            if DEBUG:
+                                log(f"  dist({element}, {prev_ref}) = {old_dist} -> {inherited_dist} (via {reference_entity}) [MORE INTERCALATIONS]")
 
                             # Propagate this update to dependent entities
                             self._propagate_distance_update(element, prev_ref, inherited_dist)
 
                 # Now check if this element has distances to multiple references
                 # This creates the multi-reference distance vectors like dist(opportunities, accounts, users) = 1, 2
-                if len(self.entity_reference_distances[element]) > 1:
+                if DEBUG and len(self.entity_reference_distances[element]) > 1:
                     all_refs = list(self.entity_reference_distances[element].keys())
                     distances_str = ", ".join([str(self.entity_reference_distances[element][ref]) for ref in all_refs])
                     log(f"  => {element} distances: [{distances_str}] to [{', '.join(all_refs)}]")
 
         # Update the distances dict based on calculated reference distances
         # For layer computation, we need the distance from each entity to the most connected one
-        log(f"=== UPDATING DISTANCES DICT ===")
-        for entity in self.entity_reference_distances:
-            for ref, dist in self.entity_reference_distances[entity].items():
-                if (entity, ref) not in self.distances or self.distances[(entity, ref)] < dist:
-                    self.distances[(entity, ref)] = dist
-                    log(f"distances[({entity}, {ref})] = {dist}")
+        if DEBUG:
+            log("=== UPDATING DISTANCES DICT ===")
+        # One tuple key and one lookup per pair; distances are >= 1, so a
+        # missing pair (0) always takes the new value
+        distances = self.distances
+        for entity, ref_distances in self.entity_reference_distances.items():
+            for ref, dist in ref_distances.items():
+                pair = (entity, ref)
+                if distances.get(pair, 0) < dist:
+                    distances[pair] = dist
+                    if DEBUG:
+                        log(f"distances[({entity}, {ref})] = {dist}")
 
     def _count_connections(self):
         """Compte le nombre de connexions pour chaque entité
@@ -203,39 +253,46 @@ class HorizontalLayerClassifier:
         # 2. Somme des connexions des voisins (critère secondaire)
         # 3. Ordre d'apparition (critère tertiaire - implicite dans max())
 
-        def get_reference_score(entity):
-            """Calcule le score de référence d'une entité avec cascade de critères"""
-            # Critère 1: Nombre de connexions directes
-            direct_connections = connections[entity]
-
-            # Critère 2: Somme des connexions des voisins
-            neighbors_connections_sum = 0
-            for left, right in self.relations:
-                if left == entity:
-                    neighbors_connections_sum += connections.get(right, 0)
-                elif right == entity:
-                    neighbors_connections_sum += connections.get(left, 0)
+        # OPTIMIZATION #6: Scores computed in one pass over the relations
+        # instead of scanning every relation for each candidate reference
+        neighbors_connections_sum = dict.fromkeys(connections, 0)
+        for left, right in self.relations:
+            neighbors_connections_sum[left] += connections[right]
+            if right != left:
+                neighbors_connections_sum[right] += connections[left]
 
-            # Retourner un tuple pour tri lexicographique
-            # (plus grand nombre de connexions, plus grande somme des voisins)
-            return (direct_connections, neighbors_connections_sum)
+        # Tuple pour tri lexicographique
+        # (plus grand nombre de connexions, plus grande somme des voisins)
+        reference_score = {
+            entity: (connections[entity], neighbors_connections_sum[entity])
+            for entity in connections
+        }
 
-        reference_entity = max(connections.keys(), key=get_reference_score)
-        ref_score = get_reference_score(reference_entity)
+        reference_entity = max(connections.keys(), key=reference_score.__getitem__)
+        ref_score = reference_score[reference_entity]
 
-        log(f"Entite de reference: {reference_entity} ({connections[reference_entity]} connexions, somme voisins: {ref_score[1]})")
+        if DEBUG:
+            log(f"Entite de reference: {reference_entity} ({connections[reference_entity]} connexions, somme voisins: {ref_score[1]})")
 
         # Étape 2: Trier les relations par connectivité
-        sorted_distances = sorted(
-            self.distances.items(),
-            key=lambda item: connections[item[0][0]] + connections[item[0][1]],
-            reverse=True
-        )
-
-        log(f"=== Relations triees par connectivite ===")
-        for idx, ((left, right), distance) in enumerate(sorted_distances[:15], 1):
-            conn_sum = connections[left] + connections[right]
-            log(f"{idx}. {left}({connections[left]}) r {right}({connections[right]}) = {conn_sum} connexions")
+        # OPTIMIZATION #8: Weight of each relation computed once, then sorted
+        # through the C-level dict __getitem__ and reused by the log below
+        relation_weight = {
+            pair: connections[pair[0]] + connections[pair[1]]
+            for pair in self.distances
+        }
+        # Flat (left, right, distance) triples: the propagation loop unpacks
+        # one tuple per relation
+        sorted_distances = [
+            (left, right, self.distances[(left, right)])
+            for left, right in sorted(relation_weight, key=relation_weight.__getitem__, reverse=True)
+        ]
+
+        if DEBUG:
+            log("=== Relations triees par connectivite ===")
+            for idx, (left, right, distance) in enumerate(sorted_distances[:15], 1):
+                conn_sum = relation_weight[(left, right)]
+                log(f"{idx}. {left}({connections[left]}) r {right}({connections[right]}) = {conn_sum} connexions")
 
         # Étape 3: Placer l'entité de référence au layer 0
         layers = {reference_entity: 0}
@@ -248,7 +305,7 @@ class HorizontalLayerClassifier:
             iteration += 1
             progress = False
 
-            for (left, right), distance in sorted_distances:
+            for left, right, distance in sorted_distances:
                 if left in layers and right not in layers:
                     layers[right] = layers[left] + distance
                     progress = True
@@ -264,44 +321,52 @@ class HorizontalLayerClassifier:
                         progress = True
 
             if not progress:
-                for entity in self.entities:
-                    if entity not in layers:
-                        layers[entity] = 0
+                # Entités non atteintes depuis la référence: layer 0 en une
+                # seule passe, ce qui complète layers et termine la boucle
+                layers.update(dict.fromkeys(
+                    [entity for entity in self.entities if entity not in layers], 0))
+                break
 
         # Afficher résumé
-        log(f"========================================")
-        log(f"DISTANCES PAR RAPPORT A {reference_entity.upper()}")
-        log(f"========================================")
-
-        by_distance = {}
-        for entity in layers.keys():
-            if entity != reference_entity:
-                dist = layers[entity]
-                if dist not in by_distance:
-                    by_distance[dist] = []
-                by_distance[dist].append(entity)
-
-        for dist in sorted(by_distance.keys()):
-            direction = "GAUCHE" if dist < 0 else ("DROITE" if dist > 0 else "MEME LAYER")
-            log(f"Distance {dist:+d} ({direction}):")
-            for entity in sorted(by_distance[dist]):
-                log(f"- {entity}")
+        # The by-distance grouping only feeds the log: skip building it
+        # unless debugging
+        if DEBUG:
+            log("========================================")
+            log(f"DISTANCES PAR RAPPORT A {reference_entity.upper()}")
+            log("========================================")
+
+            by_distance = {}
+            for entity in layers.keys():
+                if entity != reference_entity:
+                    dist = layers[entity]
+                    if dist not in by_distance:
+                        by_distance[dist] = []
+                    by_distance[dist].append(entity)
+
+            for dist in sorted(by_distance.keys()):
+                direction = "GAUCHE" if dist < 0 else ("DROITE" if dist > 0 else "MEME LAYER")
+                log(f"Distance {dist:+d} ({direction}):")
+                for entity in sorted(by_distance[dist]):
+                    log(f"- {entity}")
 
         # Normaliser
         if layers:
             min_layer = min(layers.values())
-            layers = {e: l - min_layer for e, l in layers.items()}
-            log(f"Normalisation: decalage de {-min_layer}")
-            log(f"{reference_entity} est maintenant au layer {layers[reference_entity]}")
+            # Nothing to shift when no entity went left of layer 0
+            if min_layer != 0:
+                layers = {e: l - min_layer for e, l in layers.items()}
+            if DEBUG:
+                log(f"Normalisation: decalage de {-min_layer}")
+                log(f"{reference_entity} est maintenant au layer {layers[reference_entity]}")
 
         # Grouper par layer
-        layer_dict = {}
+        # OPTIMIZATION #7: After normalisation layers are small non-negative
+        # ints, so group into a bucket list indexed by layer (no dict, no key sort)
+        buckets = [[] for _ in range(max(layers.values()) + 1)]
         for entity, layer in layers.items():
-            if layer not in layer_dict:
-                layer_dict[layer] = []
-            layer_dict[layer].append(entity)
+            buckets[layer].append(entity)
 
-        sorted_layers = [sorted(layer_dict[i]) for i in sorted(layer_dict.keys())]
+        sorted_layers = [sorted(bucket) for bucket in buckets if bucket]
         return sorted_layers
 
     def __str__(self):
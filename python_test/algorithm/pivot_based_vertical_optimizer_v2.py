@@ -26,9 +26,14 @@ class PivotBasedVerticalOptimizerV2:
 
     def __init__(self, relations: List[Tuple[str, str]]):
         self.relations = relations
-        # Build reverse relation map (target -> sources)
+        # Build forward (source -> targets) and reverse (target -> sources) relation maps
+        self.forward_relations = {}
         self.reverse_relations = {}
         for left, right in relations:
+            if left not in self.forward_relations:
+                self.forward_relations[left] = set()
+            self.forward_relations[left].add(right)
+
             if right not in self.reverse_relations:
                 self.reverse_relations[right] = set()
             self.reverse_relations[right].add(left)
@@ -84,13 +89,15 @@ class PivotBasedVerticalOptimizerV2:
 
     def _order_by_entity_order(self, layer: List[str], entity_order: List[str]) -> List[str]:
         """Order layer entities by global entity_order"""
+        layer_members = frozenset(layer)
         ordered = []
         for entity in entity_order:
-            if entity in layer:
+            if entity in layer_members:
                 ordered.append(entity)
 
+        placed = frozenset(ordered)
         for entity in layer:
-            if entity not in ordered:
+            if entity not in placed:
                 ordered.append(entity)
 
         return ordered
@@ -111,13 +118,21 @@ class PivotBasedVerticalOptimizerV2:
         3. Order groups by prev_layer order
         4. Within each group, sort by next_layer targets, then entity_order
         """
+        # Position tables for the neighbouring layers and the global order:
+        # hashed membership plus O(1) positions for the sort keys below
+        prev_pos = {e: i for i, e in enumerate(prev_layer)}
+        next_pos = {e: i for i, e in enumerate(next_layer)}
+        order_pos = {}
+        for i, e in enumerate(entity_order):
+            order_pos.setdefault(e, i)  # first occurrence, as list.index
+
         # Build source mapping: current_entity -> set of sources in prev_layer
         entity_sources = {}
         for entity in current_layer:
             sources = set()
             if entity in self.reverse_relations:
                 for source in self.reverse_relations[entity]:
-                    if source in prev_layer:
+                    if source in prev_pos:
                         sources.add(source)
             entity_sources[entity] = sources
 
@@ -125,9 +140,10 @@ class PivotBasedVerticalOptimizerV2:
         entity_targets = {}
         for entity in current_layer:
             targets = set()
-            for left, right in self.relations:
-                if left == entity and right in next_layer:
-                    targets.add(right)
+            if entity in self.forward_relations:
+                for target in self.forward_relations[entity]:
+                    if target in next_pos:
+                        targets.add(target)
             entity_targets[entity] = targets
 
         print(f"\nSource chains (Layer {prev_layer if prev_layer else '[]'} -> current -> {next_layer}):")
@@ -152,10 +168,7 @@ class PivotBasedVerticalOptimizerV2:
                 continue
 
             # Primary source = first source in prev_layer order
-            primary_source = min(
-                sources,
-                key=lambda s: prev_layer.index(s) if s in prev_layer else float('inf')
-            )
+            primary_source = min(sources, key=prev_pos.__getitem__)
 
             if primary_source not in source_groups:
                 source_groups[primary_source] = []
@@ -172,21 +185,22 @@ class PivotBasedVerticalOptimizerV2:
                 group = source_groups[source]
 
                 # Sort group by target position in next_layer, then entity_order
-                def sort_key(entity):
+                # Keys are computed once per entity into (target, order, group
+                # position, entity) tuples; group position keeps the sort stable
+                keyed = []
+                for group_idx, entity in enumerate(group):
                     targets = entity_targets[entity]
                     if not targets:
                         target_idx = float('inf')
                     else:
-                        target_idx = min(
-                            next_layer.index(t) if t in next_layer else float('inf')
-                            for t in targets
-                        )
+                        target_idx = min(next_pos[t] for t in targets)
 
-                    entity_idx = entity_order.index(entity) if entity in entity_order else float('inf')
+                    entity_idx = order_pos.get(entity, float('inf'))
 
-                    return (target_idx, entity_idx)
+                    keyed.append((target_idx, entity_idx, group_idx, entity))
 
-                sorted_group = sorted(group, key=sort_key)
+                keyed.sort()
+                sorted_group = [entity for _, _, _, entity in keyed]
 
                 # Print group info
                 for entity in sorted_group:
@@ -199,9 +213,7 @@ class PivotBasedVerticalOptimizerV2:
 
         # Add entities with no sources
         if no_source_entities:
-            no_source_entities.sort(
-                key=lambda e: entity_order.index(e) if e in entity_order else float('inf')
-            )
+            no_source_entities.sort(key=lambda e: order_pos.get(e, float('inf')))
             print(f"\n  Entities with no sources: {no_source_entities}")
             ordered.extend(no_source_entities)
 
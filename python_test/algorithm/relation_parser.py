@@ -7,6 +7,11 @@ Parses DSL input and extracts entity relations.
 from typing import List, Tuple
 
 
+# Relation operators in priority order: the first one found on a line wins,
+# wherever it sits (two-char forms before their one-char prefixes)
+_OPERATORS = ('<>', '->', '>', '<', '-')
+
+
 class RelationParser:
     """
     Parses DSL relations into normalized (left, right) tuples
@@ -28,10 +33,8 @@ class RelationParser:
         - "users.id" -> "users"
         - "accounts" -> "accounts"
         """
-        field_ref = field_ref.strip()
-        if '.' in field_ref:
-            return field_ref.split('.')[0]
-        return field_ref
+        # partition stops at the first dot and allocates no list
+        return field_ref.strip().partition('.')[0]
 
     @classmethod
     def parse(cls, dsl_input: str) -> List[Tuple[str, str]]:
@@ -50,31 +53,17 @@ class RelationParser:
             if not line or line.startswith('//'):
                 continue
 
-            # Detect relation type and parse
-            if '<>' in line:
-                parts = line.split('<>')
-                a = cls.extract_entity_name(parts[0])
-                b = cls.extract_entity_name(parts[1])
-                relations_raw.append((a, b))
-            elif '->' in line:
-                parts = line.split('->')
-                a = cls.extract_entity_name(parts[0])
-                b = cls.extract_entity_name(parts[1])
-                relations_raw.append((a, b))
-            elif '>' in line:
-                parts = line.split('>')
-                a = cls.extract_entity_name(parts[0])
-                b = cls.extract_entity_name(parts[1])
-                relations_raw.append((a, b))
-            elif '<' in line:
-                parts = line.split('<')
-                a = cls.extract_entity_name(parts[0])
-                b = cls.extract_entity_name(parts[1])
-                relations_raw.append((a, b))  # A < B means A is left of B, so A -> B
-            elif '-' in line:
-                parts = line.split('-')
-                a = cls.extract_entity_name(parts[0])
-                b = cls.extract_entity_name(parts[1])
-                relations_raw.append((a, b))
+            # Detect relation type by operator priority, then split at it
+            for operator in _OPERATORS:
+                index = line.find(operator)
+                if index != -1:
+                    break
+            else:
+                continue
+            a = cls.extract_entity_name(line[:index])
+            # The right side stops at the next occurrence of the same operator
+            b = cls.extract_entity_name(line[index + len(operator):].partition(operator)[0])
+            # Whatever the operator (even A < B), the left entity stays left: A -> B
+            relations_raw.append((a, b))
 
         return relations_raw
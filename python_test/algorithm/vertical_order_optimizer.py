@@ -18,6 +18,11 @@ class VerticalOrderOptimizer:
     def __init__(self, relations: List[Tuple[str, str]]):
         self.relations = relations
 
+        # Outgoing relations per entity (relation order kept), built once
+        self.targets_of = defaultdict(list)
+        for left, right in relations:
+            self.targets_of[left].append(right)
+
     def optimize(
         self,
         horizontal_layers: List[List[str]],
@@ -76,12 +81,18 @@ class VerticalOrderOptimizer:
         4. Order groups by target position in next_layer
         5. Within each group, sort by entity_order
         """
+        # Position of each entity in next_layer (first occurrence, like
+        # list.index), also used for next_layer membership
+        next_pos = {}
+        for idx, entity in enumerate(next_layer):
+            next_pos.setdefault(entity, idx)
+
         # Find targets for each entity in current layer
         entity_to_targets = {}
         for entity in current_layer:
             targets = [
-                right for left, right in self.relations
-                if left == entity and right in next_layer
+                right for right in self.targets_of[entity]
+                if right in next_pos
             ]
             entity_to_targets[entity] = targets
 
@@ -91,7 +102,7 @@ class VerticalOrderOptimizer:
         for entity, targets in entity_to_targets.items():
             if targets:
                 # Primary target is the first one appearing in next_layer
-                primary = min(targets, key=lambda t: next_layer.index(t))
+                primary = min(targets, key=next_pos.__getitem__)
                 entity_to_primary_target[entity] = primary
             else:
                 # No target: assign None (will be placed last)
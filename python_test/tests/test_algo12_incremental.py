@@ -12,57 +12,6 @@ import time
 from collections import defaultdict
 import algo12
 
-# Test data
-relations_input_crm = algo12.relations_input_crm
-
-def extract_table_name(s):
-    return s.split('.')[0].strip()
-
-def parse_relations(relations_input):
-    """Parse relations from DSL"""
-    relations_raw = []
-    for line in relations_input.strip().split('\n'):
-        line = line.strip()
-        if not line or line.startswith('//'):
-            continue
-
-        if '<>' in line:
-            parts = line.split('<>')
-            a = extract_table_name(parts[0])
-            b = extract_table_name(parts[1])
-            relations_raw.append((a, b))
-        elif '->' in line:
-            parts = line.split('->')
-            a = extract_table_name(parts[0])
-            b = extract_table_name(parts[1])
-            relations_raw.append((a, b))
-        elif '>' in line:
-            parts = line.split('>')
-            a = extract_table_name(parts[0])
-            b = extract_table_name(parts[1])
-            relations_raw.append((a, b))
-        elif '<' in line:
-            parts = line.split('<')
-            a = extract_table_name(parts[0])
-            b = extract_table_name(parts[1])
-            relations_raw.append((b, a))  # Reverse
-        elif '-' in line:
-            parts = line.split('-')
-            a = extract_table_name(parts[0])
-            b = extract_table_name(parts[1])
-            relations_raw.append((a, b))
-
-    # Deduplication
-    seen_pairs = {}
-    unique_relations = []
-    for a, b in relations_raw:
-        pair_key = frozenset({a, b})
-        if pair_key not in seen_pairs:
-            seen_pairs[pair_key] = (a, b)
-            unique_relations.append((a, b))
-
-    return unique_relations
-
 def build_entity_order(relations):
     """Build entity processing order (from algo10)"""
     connection_count = defaultdict(int)
@@ -323,8 +272,8 @@ def main():
     print("Testing incremental add/remove for real-time ERP visualization")
     print("="*80)
 
-    # Parse CRM dataset
-    relations = parse_relations(relations_input_crm)
+    # CRM dataset (parsed once when algo12 is imported)
+    relations = list(algo12.CRM_RELATIONS)
     entity_order = build_entity_order(relations)
 
     print(f"\nDataset: CRM")
@@ -0,0 +1,51 @@
+"""
+algo.main() as an entry point for any DSL
+
+Input that yields no relation must return an empty layout instead of failing
+in the rendering step, and the 2D rendering is skipped with render=False.
+"""
+
+import io
+import os
+import sys
+from contextlib import redirect_stdout
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+import algo
+
+
+def test_empty_dsl_returns_no_layers():
+    assert algo.main('') == []
+    assert algo.main('\n   \n') == []
+
+
+def test_comment_only_dsl_returns_no_layers():
+    assert algo.main('// only comment') == []
+    assert algo.main('// users > posts\n// posts > comments') == []
+
+
+def test_self_relation_only_dsl_returns_no_layers():
+    # Self-relations (A > A) are dropped by parse_relations
+    assert algo.main('a > a') == []
+    assert algo.main('a > a\nb -> b') == []
+
+
+def test_render_false_skips_visualisation():
+    dsl = 'users > teams\nposts > users'
+    rendered, plain = io.StringIO(), io.StringIO()
+    with redirect_stdout(rendered):
+        layers = algo.main(dsl)
+    with redirect_stdout(plain):
+        assert algo.main(dsl, render=False) == layers
+    assert "VISUALISATION 2D" in rendered.getvalue()
+    assert "VISUALISATION 2D" not in plain.getvalue()
+
+
+if __name__ == "__main__":
+    test_empty_dsl_returns_no_layers()
+    test_comment_only_dsl_returns_no_layers()
+    test_self_relation_only_dsl_returns_no_layers()
+    test_render_false_skips_visualisation()
+    print("[SUCCESS] algo.main() handles empty input and optional rendering")
@@ -0,0 +1,79 @@
+"""
+Cyclic relation sets must terminate and still produce a layout
+
+Distance propagation used to recurse until RecursionError when the relations
+contain a cycle. Distances longer than the number of entities can only come
+from going round a cycle, so they are no longer propagated: the classifiers
+(algorithm package, algo12, algo13) now return layers for these inputs.
+"""
+
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, os.path.join(HERE, '..', 'algorithm'))
+
+import algo12
+import algo13
+from layer_classification_orchestrator import LayerClassificationOrchestrator
+
+# Cycle a > b > c > a with an exit (d) and an entry (x)
+CYCLE_WITH_TAILS = """
+a > b
+b > c
+c > a
+c > d
+x > a
+"""
+CYCLE_WITH_TAILS_LAYERS = [['b'], ['c', 'x'], ['a', 'd']]
+
+# Cycles a > d > c > a and a > b > d > c > a: ended in RecursionError before
+TWO_CYCLES = """
+c > a
+b > d
+a > d
+d > c
+a > b
+"""
+TWO_CYCLES_LAYERS = [['a'], ['b'], ['c'], ['d']]
+
+
+def _algo12_layers(dsl):
+    relations = algo13.RelationParser.parse(dsl)
+    classifier = algo12.LayerClassifier()
+    for left, right in relations:
+        classifier.add_relation(left, right)
+    return classifier.compute_layers(algo13.GraphPreprocessor.build_entity_order(relations))
+
+
+def _sorted_layers(layers):
+    return [sorted(layer) for layer in layers]
+
+
+def test_package_orchestrator_terminates_on_cycles():
+    layers = LayerClassificationOrchestrator(CYCLE_WITH_TAILS).run()
+    assert _sorted_layers(layers) == CYCLE_WITH_TAILS_LAYERS
+
+    layers = LayerClassificationOrchestrator(TWO_CYCLES).run()
+    assert _sorted_layers(layers) == TWO_CYCLES_LAYERS
+
+
+def test_algo13_terminates_on_cycles():
+    layers = algo13.LayerClassificationOrchestrator(CYCLE_WITH_TAILS).run()
+    assert _sorted_layers(layers) == CYCLE_WITH_TAILS_LAYERS
+
+    layers = algo13.LayerClassificationOrchestrator(TWO_CYCLES).run()
+    assert _sorted_layers(layers) == TWO_CYCLES_LAYERS
+
+
+def test_algo12_terminates_on_cycles():
+    assert _algo12_layers(CYCLE_WITH_TAILS) == CYCLE_WITH_TAILS_LAYERS
+    assert _algo12_layers(TWO_CYCLES) == TWO_CYCLES_LAYERS
+
+
+if __name__ == "__main__":
+    test_package_orchestrator_terminates_on_cycles()
+    test_algo13_terminates_on_cycles()
+    test_algo12_terminates_on_cycles()
+    print("[SUCCESS] Cyclic relation sets terminate with the expected layers")